@@ -0,0 +1,285 @@
+"""
+Async serving mode for the Cafe API.
+
+/api/search and /api/random are answered by native async handlers backed by
+SQLAlchemy's async engine (aiosqlite). One process can then keep many of these
+requests in flight on a single event loop, without a thread per request. All
+other routes are passed to the regular Flask app through asgiref's WSGI
+adapter, so writes keep their current behaviour. Both paths share the same
+in-memory random index, catalog and response cache, so writes made through Flask
+invalidate the entries used by the async handlers.
+
+Run with an ASGI server, for example:
+
+    uvicorn --factory asgi:create_asgi_app --port 5001
+
+Requires the optional packages aiosqlite, asgiref and an ASGI server such as uvicorn.
+"""
+import asyncio
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import http_date, parse_etags
+
+from main import (
+    Cafe,
+    apply_logged_changes,
+    changed_cafes_query,
+    create_app,
+    db,
+    ensure_database,
+    is_location_lookup,
+    location_cafes_query,
+    random_cafe_query,
+    search_cache_entry,
+    search_criteria,
+    search_statement,
+)
+from route_utils.catalog import catalog_columns
+from route_utils.change_log import changes_after, latest_change
+from route_utils.metrics import install_query_events
+from route_utils.process_sync import SYNC_MAX_CHANGES, VERSION_QUERY
+from route_utils.slow_queries import current_route, install_slow_query_log
+from route_utils.route_helpers import cafe_response_columns, parse_fields, row_response, wrap_cafe, wrap_cafes
+from route_utils.sqlite_tuning import install_pragmas
+
+
+def async_database_uri(sync_uri):
+    """Switch an SQLite URI to the aiosqlite driver."""
+    return sync_uri.set(drivername="sqlite+aiosqlite")
+
+
+class CafeASGI:
+    """
+    An ASGI application serving the hot read routes asynchronously.
+
+    Args:
+        flask_app: The Flask application built by `create_app()`.
+    """
+
+    def __init__(self, flask_app):
+        from asgiref.wsgi import WsgiToAsgi
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+        self.flask_app = flask_app
+        # The same indexes and caches as the Flask views of this application
+        self.state = flask_app.extensions['cafe']
+        self.wsgi = WsgiToAsgi(flask_app)
+        with flask_app.app_context():
+            url = async_database_uri(db.engine.url)
+        options = dict(flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        if 'pool_size' in options:
+            # aiosqlite defaults to NullPool, keep connections open like the sync engine
+            options['poolclass'] = AsyncAdaptedQueuePool
+        self.engine = create_async_engine(url, **options)
+        install_pragmas(self.engine.sync_engine, flask_app.config['SQLITE_PROFILE'])
+        install_query_events(self.engine.sync_engine)
+        if flask_app.config['SLOW_QUERY_MS'] is not None:
+            install_slow_query_log(self.engine.sync_engine, flask_app.config['SLOW_QUERY_MS'])
+        self.routes = {
+            '/api/random': self.random_cafe,
+            '/api/search': self.search_cafe,
+        }
+        self._ready = False
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        handler = self.routes.get(scope['path']) if scope['type'] == 'http' else None
+        if handler is None or scope['method'] != 'GET':
+            return await self.wsgi(scope, receive, send)
+
+        metrics_token = self.state.request_metrics.start()
+        current_route.set(scope['path'])
+        await self.prepare()
+        args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        status, body, extra_headers = await handler(args, headers)
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+            + [(name.encode(), value.encode()) for name, value in extra_headers],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+        self.state.request_metrics.finish(metrics_token, scope['path'], 'GET', status, len(body))
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.prepare()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def prepare(self):
+        """Run the deferred schema setup once, off the event loop."""
+        if not self._ready:
+            await asyncio.to_thread(ensure_database, self.flask_app)
+            self._ready = True
+
+    async def sync_with_other_processes(self, connection):
+        # Same check as the Flask before_request hook, on the async connection
+        if not self.flask_app.config['SYNC_ACROSS_PROCESSES']:
+            return
+        version_watcher = self.state.version_watcher
+        version = (await connection.execute(VERSION_QUERY)).scalar()
+        if version_watcher.applied_seq is None:
+            version_watcher.applied((await connection.execute(latest_change())).scalar())
+        if not version_watcher.changed(version):
+            return
+        changes = (await connection.execute(changes_after(version_watcher.applied_seq, SYNC_MAX_CHANGES + 1))).all()
+        if len(changes) > SYNC_MAX_CHANGES:
+            self.state.reset()
+            version_watcher.applied((await connection.execute(latest_change())).scalar())
+        else:
+            rows = (await connection.execute(changed_cafes_query({change.cafe_id for change in changes}))).all()
+            with self.flask_app.app_context():
+                apply_logged_changes(changes, rows)
+
+    def respond(self, payload, status):
+        return status, self.flask_app.json.dumps_bytes(payload)
+
+    def respond_cafe(self, row, fields):
+        """Build a single cafe response like `_single_cafe_response`, from the cafe's cached JSON for full rows."""
+        if fields is None:
+            return 200, wrap_cafe(self.state.cafe_fragments.join([row], self.flask_app.json.dumps_bytes))
+        return self.respond({'cafe': row_response(row, fields)}, 200)
+
+    def respond_cafes(self, rows, fields):
+        """Build a search response like `many_responses`, from cached per-cafe JSON for full rows."""
+        if not rows:
+            return self.respond({'error': {'Not Found': 'No cafes found in the database'}}, 404)
+        if fields is None:
+            return 200, wrap_cafes(self.state.cafe_fragments.join(rows, self.flask_app.json.dumps_bytes))
+        return self.respond({'cafes': [row_response(row, fields) for row in rows]}, 200)
+
+    def cached(self, entry, headers):
+        """
+        Turn a cache entry into a response, compressed when the client accepts
+        it, answering 304 to matching validators.
+        """
+        encoding, varies = entry.negotiate(headers.get('accept-encoding'), self.state.response_cache.compress_min_size)
+        etag = entry.etag if encoding is None else f'{entry.etag}-{encoding}'
+        extra_headers = [('etag', f'"{etag}"'), ('last-modified', http_date(entry.last_modified))]
+        if varies:
+            extra_headers.append(('vary', 'Accept-Encoding'))
+        if entry.status == 200 and parse_etags(headers.get('if-none-match')).contains(etag):
+            return 304, b'', extra_headers
+        if encoding is None:
+            return entry.status, entry.body, extra_headers
+        return entry.status, entry.encoded_body(encoding), extra_headers + [('content-encoding', encoding)]
+
+    async def build_cached(self, key, tags, build, headers):
+        entry, generation = self.state.response_cache.lookup(key)
+        if entry is None:
+            result = await build()
+            if result is None:
+                return None
+            status, body = result
+            entry = self.state.response_cache.store(key, body, status, 'application/json', tags, generation)
+        return self.cached(entry, headers)
+
+    async def catalog_snapshot(self):
+        """Return the in-memory catalog, loading it on the async engine on first use."""
+        catalog = self.state.catalog
+        snapshot = catalog.snapshot
+        if snapshot is not None and not self.flask_app.config['SYNC_ACROSS_PROCESSES']:
+            return snapshot
+        async with self.engine.connect() as connection:
+            await self.sync_with_other_processes(connection)
+            snapshot = catalog.snapshot
+            if snapshot is None:
+                generation = catalog.generation
+                stmt = db.select(*catalog_columns(Cafe, cafe_response_columns(Cafe)))
+                snapshot = catalog.install((await connection.execute(stmt)).all(), generation)
+        return snapshot
+
+    async def random_cafe(self, args, headers):
+        try:
+            fields = parse_fields(args)
+        except ValueError as error:
+            return (*self.respond({'error': {'error': str(error)}}, 400), [])
+
+        if self.flask_app.config['CATALOG_ENABLED']:
+            record = (await self.catalog_snapshot()).choice()
+            if record is None:
+                return (*self.respond({'error': {'Not Found': 'No cafes found in the database'}}, 404), [])
+            return (*self.respond_cafe(record, fields), [])
+
+        async with self.engine.connect() as connection:
+            await self.sync_with_other_processes(connection)
+            random_index = self.state.random_index
+            while not random_index.loaded:
+                # Read again if a write landed while the ids were being read
+                generation = random_index.generation
+                random_index.load((await connection.execute(db.select(Cafe.id))).scalars(), generation)
+
+            # Ids removed by another process are dropped and another id is tried
+            while (cafe_id := random_index.choice()) is not None:
+                row = (await connection.execute(random_cafe_query(cafe_id, fields))).first()
+                if row is not None:
+                    return (*self.respond_cafe(row, fields), [])
+                random_index.discard(cafe_id)
+
+        return (*self.respond({'error': {'Not Found': 'No cafes found in the database'}}, 404), [])
+
+    async def search_cafe(self, args, headers):
+        try:
+            loc, match, filters = search_criteria(args)
+            fields = parse_fields(args)
+        except ValueError as error:
+            return (*self.respond({'error': {'error': str(error)}}, 400), [])
+        key, tags = search_cache_entry(loc, match, filters, fields)
+        location_lookup = is_location_lookup(loc, match, filters, fields)
+
+        if self.flask_app.config['CATALOG_ENABLED'] and not location_lookup:
+            snapshot = await self.catalog_snapshot()
+
+            async def build_from_catalog():
+                return self.respond_cafes(snapshot.search(loc, match, filters), fields)
+
+            return await self.build_cached(key, tags, build_from_catalog, headers)
+
+        async with self.engine.connect() as connection:
+            await self.sync_with_other_processes(connection)
+
+            async def build_from_location_index():
+                location_index = self.state.location_index
+                fragment = location_index.get(loc)
+                if fragment is None:
+                    generation = location_index.generation
+                    rows = (await connection.execute(location_cafes_query(loc))).all()
+                    fragment = location_index.install(
+                        loc, ((row.id, row_response(row)) for row in rows), self.flask_app.json.dumps_bytes, generation
+                    )
+                if not fragment:
+                    return self.respond({'error': {'Not Found': 'No cafes found in the database'}}, 404)
+                return 200, wrap_cafes(fragment)
+
+            async def build():
+                rows = (await connection.execute(search_statement(loc, match, filters, fields))).all()
+                return self.respond_cafes(rows, fields)
+
+            return await self.build_cached(key, tags, build_from_location_index if location_lookup else build, headers)
+
+
+def create_asgi_app(config=None):
+    """
+    Create the ASGI application.
+
+    Args:
+        config: Optional configuration overrides passed to `create_app`.
+    """
+    return CafeASGI(create_app(config))
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(create_asgi_app(), port=5001)
@@ -0,0 +1,381 @@
+"""
+Benchmark every API route against a database of synthetic cafes.
+
+A template database with `--rows` cafes is seeded once (see synthetic.py) and
+copied for each transport, so writes made by one run never leak into the next.
+Each route is then driven in two ways:
+
+- client: Flask's test client in this process, which measures the view, the
+  queries and serialization without any network or server overhead;
+- server: serve.py in a separate process, called over HTTP by `--concurrency`
+  client threads with keep-alive connections, as a real deployment would be.
+
+For every route the p50, p95 and p99 latency and the throughput are reported.
+With `--save-baseline` the results are written to a JSON file. `--baseline`
+compares a run with that file and exits with status 1 when a route's p95 grew,
+or its throughput shrank, by more than `--threshold` percent.
+
+By default the caches stay on (`--cache warm`), as in production. With
+`--cache cold` the response cache, the per-location index and the per-cafe
+fragment cache are disabled, so every read runs its queries and serializes
+its rows; compare baselines taken in this mode to catch regressions in the
+query and serialization paths that the caches otherwise hide.
+
+Usage:
+    python benchmarks/routes.py --rows 100000 --requests 500 --save-baseline baseline.json
+    python benchmarks/routes.py --rows 100000 --requests 500 --baseline baseline.json
+    python benchmarks/routes.py --rows 100000 --requests 100 --cache cold --save-baseline cold.json
+
+Example results (10,000 rows, 300 requests per route, server with 1 worker and
+4 threads, 4 client threads, 1 vCPU Linux VM, Python 3.11):
+
+    --cache warm
+    transport  route             p50 ms   p95 ms   p99 ms    req/s
+    client     random              1.40     1.55     1.80    727.0
+    client     all                 0.75     0.93     1.15   1309.3
+    client     all-page            2.54     2.84     3.70    394.7
+    client     search              1.84     3.39    15.43    425.0
+    client     add                 2.34     2.86     5.96    415.0
+    client     update-price        2.05     2.31     3.72    484.3
+    client     report-closed       2.06     2.49     6.54    455.0
+    server     random              7.37    10.40    11.97    549.9
+    server     all                 7.48    12.65    15.52    511.7
+    server     all-page           10.18    15.52    16.48    385.0
+    server     search              7.98    20.24    45.25    395.1
+    server     add                12.22    19.20    31.18    311.3
+    server     update-price       10.92    20.14    25.35    346.7
+    server     report-closed       8.40    12.79    17.66    456.3
+
+    --cache cold
+    transport  route             p50 ms   p95 ms   p99 ms    req/s
+    client     random              0.95     1.58     1.67    934.7
+    client     all               132.69   175.22   179.43      7.6
+    client     all-page            3.27     3.53     4.43    301.3
+    client     search              2.06     6.00    30.29    270.8
+    client     add                 2.26     2.86     6.48    428.6
+    client     update-price        1.50     2.21     2.87    613.5
+    client     report-closed       2.04     2.89     6.60    448.0
+    server     random              7.97    10.37    11.98    514.3
+    server     all               518.01   757.75   828.36      7.3
+    server     all-page           11.90    18.26    27.83    325.5
+    server     search             11.26    31.45    68.62    263.2
+    server     add                10.39    15.78    20.84    365.6
+    server     update-price        7.34    10.83    14.46    523.4
+    server     report-closed       7.87    12.44    16.01    495.7
+
+With warm caches, the full /api/all is one response cache hit after warmup,
+and in server mode the cost of reads is dominated by HTTP handling on a
+single core shared with the client threads. The unpaginated /api/all costs
+a full table read per request in cold mode, so lower `--requests` on large
+tables. On that VM two back-to-back runs of the same commit differed by up
+to 35% on p95, so use more requests, a quieter machine or a larger
+`--threshold` before treating a flagged route as a regression.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import LOCATIONS, seed_database  # noqa: E402
+from route_utils.pagination import encode_cursor  # noqa: E402
+
+ROUTES = ["random", "all", "all-page", "search", "add", "update-price", "report-closed"]
+API_KEY = "benchmark-key"
+# Settings of each --cache mode. "cold" turns off every cache of serialized
+# responses, so reads measure the queries and serialization behind them.
+CACHE_MODES = {
+    "warm": {},
+    "cold": {"RESPONSE_CACHE_SIZE": 0, "LOCATION_INDEX_SIZE": 0, "FRAGMENT_CACHE_SIZE": 0},
+}
+
+
+class Workload:
+    """
+    Produces the requests of each route as (method, path, form) tuples.
+
+    Reads vary from one request to the next: "all-page" starts each page after
+    a random seeded cafe and "search" mixes exact, prefix and filtered searches
+    over every location, so the response cache only helps as much as real
+    traffic would let it. "all" always asks for the full, unpaginated list.
+
+    Write routes use ids and names that no other request touches: updates pick
+    random seeded cafes, deletes walk down from the highest seeded id and adds
+    create new names, so every request succeeds whatever the order.
+    """
+
+    def __init__(self, rows, seed=0):
+        self.rows = rows
+        self._rng = random.Random(seed)
+        self._next_delete = rows
+        self._next_add = 0
+        self._lock = threading.Lock()
+
+    def request(self, route):
+        with self._lock:
+            if route == "random":
+                return "GET", "/api/random", None
+            if route == "all":
+                return "GET", "/api/all", None
+            if route == "all-page":
+                # Seeded cafe n is named "Cafe n" and has id n + 1
+                index = self._rng.randrange(self.rows)
+                return "GET", "/api/all?" + urlencode({"limit": 100, "cursor": encode_cursor(f"Cafe {index}", index + 1)}), None
+            if route == "search":
+                return "GET", "/api/search?" + urlencode(self._search_args()), None
+            if route == "add":
+                self._next_add += 1
+                return "POST", "/api/add", {
+                    "name": f"Benchmark cafe {self._next_add}",
+                    "map_url": "https://maps.example.com/new",
+                    "img_url": "https://img.example.com/new.jpg",
+                    "loc": self._rng.choice(LOCATIONS),
+                    "seats": "20-30",
+                    "coffee_price": "£2.50",
+                    "wifi": "1",
+                }
+            if route == "update-price":
+                cafe_id = self._rng.randint(1, self.rows // 2)
+                price = f"£{self._rng.randint(150, 450) / 100:.2f}"
+                return "PATCH", f"/api/update-price/{cafe_id}?" + urlencode({"new_price": price}), None
+            if route == "report-closed":
+                cafe_id, self._next_delete = self._next_delete, self._next_delete - 1
+                return "DELETE", f"/api/report-closed/{cafe_id}?" + urlencode({"api-key": API_KEY}), None
+        raise ValueError(f"Unknown route {route!r}")
+
+    def _search_args(self):
+        location = self._rng.choice(LOCATIONS)
+        kind = self._rng.randrange(3)
+        if kind == 0:
+            return {"loc": location}
+        if kind == 1:
+            # "Town 4" also matches towns 40-49 and 400-499
+            return {"loc": location[:-1] or location, "match": "prefix"}
+        return {"loc": location, "min_price": "2", "currency": "GBP", "sort": "price"}
+
+
+def summarize(latencies, elapsed):
+    """Return the p50/p95/p99 latency in milliseconds and the throughput."""
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50": cuts[49] * 1000,
+        "p95": cuts[94] * 1000,
+        "p99": cuts[98] * 1000,
+        "rps": len(latencies) / elapsed,
+    }
+
+
+def check_status(route, status):
+    if status != 200:
+        raise RuntimeError(f"{route} returned HTTP {status}")
+
+
+def run_client(database, rows, requests, warmup, cache):
+    """Drive every route through Flask's test client."""
+    from main import create_app
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}", "SECRET_API": API_KEY, **CACHE_MODES[cache]})
+    client = app.test_client()
+    workload = Workload(rows)
+    results = {}
+    for route in ROUTES:
+        for _ in range(warmup):
+            method, path, form = workload.request(route)
+            client.open(path, method=method, data=form)
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            method, path, form = workload.request(route)
+            sent = time.perf_counter()
+            response = client.open(path, method=method, data=form)
+            latencies.append(time.perf_counter() - sent)
+            check_status(route, response.status_code)
+        results[route] = summarize(latencies, time.perf_counter() - started)
+    with app.app_context():
+        from main import db
+
+        db.engine.dispose()
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database, port, workers, threads, cache):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}", SECRET_API=API_KEY)
+    env.update({name: str(value) for name, value in CACHE_MODES[cache].items()})
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--threads", str(threads)],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("serve.py did not start")
+
+
+def run_server(database, rows, requests, warmup, concurrency, workers, threads, cache):
+    """Drive every route over HTTP against serve.py."""
+    port = free_port()
+    server = start_server(database, port, workers, threads, cache)
+    local = threading.local()
+
+    def send(workload, route):
+        method, path, form = workload.request(route)
+        body = urlencode(form) if form else None
+        headers = {"Content-Type": "application/x-www-form-urlencoded"} if form else {}
+        sent = time.perf_counter()
+        for attempt in range(2):
+            connection = getattr(local, "connection", None)
+            if connection is None:
+                connection = local.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # The server closed an idle keep-alive connection, reconnect once
+                connection.close()
+                local.connection = None
+                if attempt:
+                    raise
+        if response.will_close:
+            connection.close()
+            local.connection = None
+        check_status(route, response.status)
+        return time.perf_counter() - sent
+
+    try:
+        workload = Workload(rows)
+        results = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for route in ROUTES:
+                list(pool.map(lambda _: send(workload, route), range(warmup)))
+                started = time.perf_counter()
+                latencies = list(pool.map(lambda _: send(workload, route), range(requests)))
+                results[route] = summarize(latencies, time.perf_counter() - started)
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def compare(results, baseline, threshold):
+    """
+    Print how `results` moved against `baseline`.
+
+    Returns:
+        The list of "transport/route" names that regressed beyond `threshold` percent.
+    """
+    regressions = []
+    print(f"\n{'transport':<10} {'route':<15} {'p95 change':>11} {'req/s change':>13}")
+    for transport, routes in results.items():
+        for route, result in routes.items():
+            before = baseline.get(transport, {}).get(route)
+            if before is None:
+                continue
+            p95_change = (result["p95"] / before["p95"] - 1) * 100
+            rps_change = (result["rps"] / before["rps"] - 1) * 100
+            regressed = p95_change > threshold or rps_change < -threshold
+            if regressed:
+                regressions.append(f"{transport}/{route}")
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{transport:<10} {route:<15} {p95_change:>+10.1f}% {rps_change:>+12.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000, help="Synthetic cafes to seed (1,000 to 1,000,000).")
+    parser.add_argument("--requests", type=int, default=300, help="Measured requests per route.")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per route before measuring.")
+    parser.add_argument("--transports", nargs="+", default=["client", "server"], choices=["client", "server"])
+    parser.add_argument("--concurrency", type=int, default=4, help="Client threads in server mode.")
+    parser.add_argument("--workers", type=int, default=1, help="serve.py worker processes.")
+    parser.add_argument("--threads", type=int, default=4, help="serve.py threads per worker.")
+    parser.add_argument("--cache", default="warm", choices=list(CACHE_MODES),
+                        help="'cold' disables the response, location and fragment caches.")
+    parser.add_argument("--template", help="Seeded database to reuse between runs. Created if missing.")
+    parser.add_argument("--baseline", help="Compare against this results file.")
+    parser.add_argument("--save-baseline", help="Write the results to this file.")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent.")
+    args = parser.parse_args()
+
+    # Every delete removes one seeded cafe, the rest are left for the reads
+    needed = 2 * (args.requests + args.warmup)
+    if args.rows < needed:
+        parser.error(f"--rows must be at least {needed} for this many report-closed requests")
+
+    with tempfile.TemporaryDirectory() as directory:
+        template = os.path.abspath(args.template or os.path.join(directory, "template.db"))
+        started = time.perf_counter()
+        if seed_database(f"sqlite:///{template}", args.rows):
+            print(f"Seeded {args.rows} cafes in {time.perf_counter() - started:.1f}s")
+
+        results = {}
+        for transport in args.transports:
+            database = os.path.join(directory, f"{transport}.db")
+            shutil.copy(template, database)
+            if transport == "client":
+                results[transport] = run_client(database, args.rows, args.requests, args.warmup, args.cache)
+            else:
+                results[transport] = run_server(
+                    database, args.rows, args.requests, args.warmup, args.concurrency, args.workers, args.threads,
+                    args.cache,
+                )
+
+    print(f"{'transport':<10} {'route':<15} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+    for transport, routes in results.items():
+        for route, result in routes.items():
+            print(
+                f"{transport:<10} {route:<15} {result['p50']:>8.2f} {result['p95']:>8.2f}"
+                f" {result['p99']:>8.2f} {result['rps']:>8.1f}"
+            )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump({"rows": args.rows, "cache": args.cache, "results": results}, file, indent=2)
+        print(f"\nSaved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("rows") != args.rows:
+            print(f"\nWarning: the baseline was recorded with {baseline.get('rows')} rows")
+        if baseline.get("cache", "warm") != args.cache:
+            print(f"\nWarning: the baseline was recorded with --cache {baseline.get('cache', 'warm')}")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} route(s) regressed by more than {args.threshold}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
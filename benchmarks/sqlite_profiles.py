@@ -0,0 +1,145 @@
+"""
+Benchmark read throughput of the SQLite engine profiles while a writer is active.
+
+Each profile in `route_utils.sqlite_tuning.SQLITE_PROFILES` gets a fresh database
+seeded with synthetic cafes. Reader threads then run the /api/search and
+/api/random queries in a loop while one writer thread keeps updating coffee
+prices, committing every write, in the same way /api/update-price does.
+
+Usage:
+    python benchmarks/sqlite_profiles.py --rows 20000 --readers 4 --duration 5
+
+Example results (20,000 rows, 4 readers, 1 writer, 5 s, 1 vCPU Linux VM, ext4, SQLite 3.40):
+
+    profile    reads/s   writes/s  read errors
+    default       1003        849            0
+    wal           2961        946            0
+
+With the default rollback journal, each commit takes an exclusive lock that
+readers must wait out (up to busy_timeout). With WAL, readers keep working
+from the last committed snapshot, so read throughput roughly triples while
+write throughput is unchanged. Expect larger gaps on machines with more cores
+and slower fsync.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+from route_utils.sqlite_tuning import SQLITE_PROFILES, engine_options, install_pragmas
+
+LOCATIONS = [f"Town {number}" for number in range(200)]
+
+
+def seed(engine, table, rows):
+    values = [
+        {
+            "name": f"Cafe {index}",
+            "map_url": f"https://maps.example.com/{index}",
+            "img_url": f"https://img.example.com/{index}.jpg",
+            "location": LOCATIONS[index % len(LOCATIONS)],
+            "location_key": LOCATIONS[index % len(LOCATIONS)].casefold(),
+            "seats": "20-30",
+            "has_toilet": index % 2 == 0,
+            "has_wifi": index % 3 == 0,
+            "has_sockets": index % 5 == 0,
+            "can_take_calls": index % 7 == 0,
+            "coffee_price": "£2.40",
+        }
+        for index in range(1, rows + 1)
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(table), values)
+
+
+def run_profile(profile, table, create_schema, rows, readers, duration):
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = create_engine(url, **engine_options(url, profile, pool_size=readers + 1))
+        install_pragmas(engine, profile)
+        create_schema(engine)
+        seed(engine, table, rows)
+
+        stop = threading.Event()
+        counts = {"reads": 0, "writes": 0, "read_errors": 0}
+        lock = threading.Lock()
+
+        def reader():
+            reads = errors = 0
+            search = select(table).where(table.c.location_key == "town 1").order_by(table.c.name)
+            while not stop.is_set():
+                try:
+                    with engine.connect() as connection:
+                        connection.execute(search).all()
+                        connection.execute(select(table).where(table.c.id == random.randint(1, rows))).first()
+                    reads += 2
+                except OperationalError:
+                    errors += 1
+            with lock:
+                counts["reads"] += reads
+                counts["read_errors"] += errors
+
+        def writer():
+            writes = 0
+            while not stop.is_set():
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(
+                            update(table)
+                            .where(table.c.id == random.randint(1, rows))
+                            .values(coffee_price=f"£{random.randint(100, 400) / 100:.2f}")
+                        )
+                    writes += 1
+                except OperationalError:
+                    pass
+            with lock:
+                counts["writes"] += writes
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)] + [threading.Thread(target=writer)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    return {key: value / duration if key != "read_errors" else value for key, value in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PROFILES), choices=list(SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    # Importing the app does no database work; point it at a throwaway database anyway,
+    # so nothing here can open the real one
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'app.db')}"
+        from main import Cafe, db
+        from route_utils.fulltext import create_fulltext_index
+
+        def create_schema(engine):
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                create_fulltext_index(connection)
+
+        print(f"{'profile':<8} {'reads/s':>9} {'writes/s':>10} {'read errors':>12}")
+        for profile in args.profiles:
+            result = run_profile(profile, Cafe.__table__, create_schema, args.rows, args.readers, args.duration)
+            print(f"{profile:<8} {result['reads']:>9.0f} {result['writes']:>10.0f} {result['read_errors']:>12}")
+
+
+if __name__ == "__main__":
+    main()
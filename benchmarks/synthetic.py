@@ -0,0 +1,113 @@
+"""
+Generate synthetic cafes and seed a database with them.
+
+The data roughly follows the shape of the real catalogue: a long tail of
+locations where a few towns hold most cafes, seat ranges such as "20-30" or
+"50+", prices in a handful of currencies and map URLs where about a third
+carry coordinates. Generation is deterministic for a given seed, so runs on
+different machines or commits use the same data.
+
+Usage:
+    python benchmarks/synthetic.py --rows 100000 --database /tmp/bench.db
+
+Rows are inserted through `route_utils.bulk_import`, the same path as
+/api/bulk-add, so the derived columns (location_key, coordinates, numeric
+seats and prices) and the search indexes are filled in as in production.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LOCATIONS = [f"Town {number}" for number in range(500)]
+SEATS = ["0-10", "10-20", "20-30", "30-40", "40-50", "50+"]
+PRICES = [("£", 180, 420), ("$", 200, 550), ("€", 190, 480)]
+
+
+def location_for(index):
+    """Return the location of the cafe at `index`, skewed towards the first towns."""
+    # Inverse power law: town 0 gets the most cafes, the tail gets a few each
+    position = int(len(LOCATIONS) * (index * 0.6180339887 % 1) ** 3)
+    return LOCATIONS[position]
+
+
+def generate_cafes(rows, seed=0, start=0):
+    """
+    Yield synthetic cafes as (line, record) tuples in the /api/bulk-add format.
+
+    Args:
+        rows: The number of cafes to generate.
+        seed: The random seed.
+        start: The index of the first cafe, to extend an existing data set.
+    """
+    rng = random.Random(seed + start)
+    for index in range(start, start + rows):
+        symbol, low, high = PRICES[index % len(PRICES)]
+        if index % 3 == 0:
+            lat, lng = rng.uniform(50.0, 56.0), rng.uniform(-4.0, 1.5)
+            map_url = f"https://www.google.com/maps/@{lat:.5f},{lng:.5f},17z"
+        else:
+            map_url = f"https://maps.example.com/place/{index}"
+        yield index + 1, {
+            "name": f"Cafe {index}",
+            "map_url": map_url,
+            "img_url": f"https://img.example.com/{index}.jpg",
+            "loc": location_for(index),
+            "seats": rng.choice(SEATS),
+            "coffee_price": f"{symbol}{rng.randint(low, high) / 100:.2f}",
+            "toilet": rng.random() < 0.6,
+            "wifi": rng.random() < 0.8,
+            "sockets": rng.random() < 0.5,
+            "calls": rng.random() < 0.3,
+        }
+
+
+def seed_database(database_uri, rows, seed=0, batch_size=1000):
+    """
+    Create the schema at `database_uri` and fill it with `rows` synthetic cafes.
+
+    Cafes already present are kept, and only the missing ones are generated,
+    so a seeded file can be reused across runs.
+
+    Returns:
+        The number of cafes inserted.
+    """
+    from main import Cafe, create_app, db, ensure_database
+    from route_utils.bulk_import import import_cafes
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": database_uri})
+    ensure_database(app)
+    with app.app_context():
+        existing = db.session.execute(db.select(db.func.count(Cafe.id))).scalar()
+        if existing >= rows:
+            return 0
+        inserted, errors = import_cafes(
+            db.session, Cafe, generate_cafes(rows - existing, seed, start=existing), batch_size
+        )
+        if errors:
+            raise RuntimeError(f"Synthetic data was rejected: {errors[0]}")
+        db.session.commit()
+        db.engine.dispose()
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument(
+        "--database", default=os.path.join("instance", "cafes.db"), help="SQLite file to create or extend."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.database)), exist_ok=True)
+    started = time.perf_counter()
+    inserted = seed_database(f"sqlite:///{os.path.abspath(args.database)}", args.rows, args.seed)
+    print(f"Inserted {inserted} cafes into {args.database} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
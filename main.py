@@ -1,12 +1,34 @@
-from flask import Flask, jsonify, render_template, request
+import threading
+
+import click
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, render_template, request
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, validates
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import Integer, String, Boolean, func, select
-from icecream import ic
+from sqlalchemy import Integer, String, Boolean, Float, Index, func, select, tuple_
 from os import getenv
-from route_utils.route_helpers import get_cafe_response, many_responses, new_cafe_check
-from dotenv import load_dotenv, dotenv_values 
+from route_utils.route_helpers import cafe_response_columns, get_cafe_response, many_responses, new_cafe_check, normalize_location, parse_fields, prefix_upper_bound, row_response, wrap_cafe, wrap_cafes
+from route_utils.json_provider import FastJSONProvider
+from route_utils.random_index import RandomCafeIndex
+from route_utils.pagination import MAX_PAGE_SIZE, STREAM_BATCH_SIZE, page_response, parse_offset, parse_page_args, stream_response
+from route_utils.schema import add_missing_columns, backfill_columns
+from route_utils.amenity_index import AMENITIES, AmenityBitmapIndex, bitset_ids, parse_amenity_filters
+from route_utils.response_cache import DEFAULT_MAX_BYTES, ResponseCache, cafe_tags
+from route_utils.compression import DEFAULT_MIN_SIZE, compress_response
+from route_utils.bulk_import import DEFAULT_BATCH_SIZE, FORMATS, BulkImportError, detect_format, import_cafes, iter_records
+from route_utils.sqlite_tuning import engine_options, install_pragmas
+from route_utils.process_sync import SYNC_MAX_CHANGES, VersionWatcher, create_version_table, read_version
+from route_utils.numeric_fields import parse_price, parse_range_filters, parse_seats
+from route_utils.price_updates import parse_price_updates, update_prices
+from route_utils.event_stream import DEFAULT_MAX_SUBSCRIBERS, DEFAULT_POLL_INTERVAL, DEFAULT_QUEUE_SIZE, EventBroker, SubscriberLimitReached, parse_last_event_id, stream_response as event_stream_response
+from route_utils.metrics import RequestMetrics, install_query_events
+from route_utils.slow_queries import install_slow_query_log
+from route_utils.catalog import CafeCatalog, CafeRecord, catalog_columns, record_from_model
+from route_utils.location_index import DEFAULT_MAX_LOCATIONS, LocationFragmentIndex
+from route_utils.fragment_cache import DEFAULT_MAX_FRAGMENTS, CafeFragmentCache
+from route_utils.change_log import changes_after, changes_since, create_change_log, latest_change, parse_since
+from route_utils.geo import RTREE_TABLE, box_condition, cafe_rtree, create_spatial_index, nearest, parse_coordinates
+from route_utils.fulltext import FTS_TABLE, build_match_query, cafe_fts, create_fulltext_index, fulltext_condition
 '''
 Install the required packages first: 
 Open the Terminal in PyCharm (bottom left). 
@@ -19,20 +41,10 @@ pip3 install -r requirements.txt
 
 This will install the packages from requirements.txt for this project.
 '''
-# loading variables from .env file
-load_dotenv() 
-
-SECRET_API = getenv('SECRET_API')
-
-app = Flask(__name__)
-
 # CREATE DB
 class Base(DeclarativeBase):
     pass
-# Connect to Database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///cafes.db'
 db = SQLAlchemy(model_class=Base)
-db.init_app(app)
 
 
 # Cafe TABLE Configuration
@@ -52,7 +64,21 @@ class Cafe(db.Model):
         has_sockets (bool): Indicates if the cafe has power sockets.
         can_take_calls (bool): Indicates if the cafe can take phone calls.
         coffee_price (str): The price range of the coffee served in the cafe.
+        location_key (str): The normalized location used for indexed searches.
+        latitude (float): The latitude parsed from map_url, if it has coordinates.
+        longitude (float): The longitude parsed from map_url, if it has coordinates.
+        seats_min (int): The lower bound parsed from seats.
+        seats_max (int): The upper bound parsed from seats, None for open ranges such as "50+".
+        price_minor (int): The coffee price in minor units, e.g. 240 for "£2.40".
+        price_currency (str): The ISO 4217 currency of the coffee price, if known.
     """
+    __table_args__ = (
+        Index('ix_cafe_location_key_name', 'location_key', 'name'),
+        Index('ix_cafe_latitude_longitude', 'latitude', 'longitude'),
+        Index('ix_cafe_seats_min', 'seats_min'),
+        Index('ix_cafe_price_minor', 'price_minor'),
+    )
+
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(250), unique=True, nullable=False)
     map_url: Mapped[str] = mapped_column(String(500), nullable=False)
@@ -64,54 +90,577 @@ class Cafe(db.Model):
     has_sockets: Mapped[bool] = mapped_column(Boolean, nullable=False)
     can_take_calls: Mapped[bool] = mapped_column(Boolean, nullable=False)
     coffee_price: Mapped[str] = mapped_column(String(250), nullable=True)
+    location_key: Mapped[str] = mapped_column(String(250), nullable=True)
+    latitude: Mapped[float] = mapped_column(Float, nullable=True)
+    longitude: Mapped[float] = mapped_column(Float, nullable=True)
+    seats_min: Mapped[int] = mapped_column(Integer, nullable=True)
+    seats_max: Mapped[int] = mapped_column(Integer, nullable=True)
+    price_minor: Mapped[int] = mapped_column(Integer, nullable=True)
+    price_currency: Mapped[str] = mapped_column(String(3), nullable=True)
+
+    @validates('location')
+    def _sync_location_key(self, key, location):
+        # Keep the indexed search key in step with the location
+        self.location_key = normalize_location(location)
+        return location
+
+    @validates('map_url')
+    def _sync_coordinates(self, key, map_url):
+        # Keep the spatially indexed coordinates in step with the map URL
+        self.latitude, self.longitude = parse_coordinates(map_url)
+        return map_url
+
+    @validates('seats')
+    def _sync_seat_range(self, key, seats):
+        # Keep the indexed seat range in step with the seats text
+        self.seats_min, self.seats_max = parse_seats(seats)
+        return seats
+
+    @validates('coffee_price')
+    def _sync_price(self, key, coffee_price):
+        # Keep the indexed price in step with the price text
+        self.price_minor, self.price_currency = parse_price(coffee_price)
+        return coffee_price
+
+
+class CafeState:
+    """
+    The in-memory indexes, caches and event broker of one application.
+
+    `create_app` builds one per application and stores it in
+    `app.extensions['cafe']`, so applications on different databases in the
+    same process never share cached data. Views reach it through `cafe_state()`.
+
+    Args:
+        config: The application config, read for the size limits.
+    """
+
+    def __init__(self, config):
+        # In-memory index of live cafe ids used by /api/random
+        self.random_index = RandomCafeIndex()
+        # In-memory bitmap index of amenities used by /api/filter
+        self.amenity_index = AmenityBitmapIndex()
+        # Serialized responses of the read routes, invalidated by the write routes
+        self.response_cache = ResponseCache(
+            max_entries=config['RESPONSE_CACHE_SIZE'],
+            compress_min_size=config['COMPRESSION_MIN_SIZE'],
+            max_bytes=config['RESPONSE_CACHE_BYTES'],
+        )
+        # Notices writes made by other worker processes
+        self.version_watcher = VersionWatcher()
+        # Pushes write events to the /api/stream subscribers of this process
+        self.event_broker = EventBroker(
+            queue_size=config['SSE_QUEUE_SIZE'],
+            max_subscribers=config['SSE_MAX_SUBSCRIBERS'],
+            poll_interval=config['SSE_POLL_INTERVAL'],
+        )
+        # Latency, response size and query histograms served on /metrics
+        self.request_metrics = RequestMetrics()
+        # Pre-serialized exact-location /api/search results
+        self.location_index = LocationFragmentIndex(max_locations=config['LOCATION_INDEX_SIZE'])
+        # Encoded JSON of each cafe, joined into the list responses
+        self.cafe_fragments = CafeFragmentCache(max_entries=config['FRAGMENT_CACHE_SIZE'])
+        # Optional in-memory copy of the cafe table serving the read routes (CATALOG_ENABLED)
+        self.catalog = CafeCatalog()
+
+    def reset(self):
+        """Drop the in-memory indexes and cached responses so they are rebuilt from the database."""
+        self.random_index.reset()
+        self.amenity_index.reset()
+        self.response_cache.clear()
+        self.catalog.reset()
+        self.location_index.reset()
+        self.cafe_fragments.clear()
+
+
+def cafe_state() -> CafeState:
+    """Return the `CafeState` of the current application."""
+    return current_app.extensions['cafe']
+
+
+api = Blueprint('api', __name__, cli_group=None)
+# Serializes the deferred schema setup between request threads
+_setup_lock = threading.Lock()
+
+
+@api.before_app_request
+def start_request_metrics():
+    # Registered first so the measurement covers the other hooks too
+    g.request_metrics = cafe_state().request_metrics.start()
+
+
+@api.after_app_request
+def record_request_metrics(response):
+    token = g.pop('request_metrics', None)
+    if token is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        cafe_state().request_metrics.finish(token, route, request.method, response.status_code, response.content_length)
+    return response
+
+
+@api.after_app_request
+def compress_uncached_response(response):
+    # Runs before record_request_metrics, so the metrics see the bytes sent.
+    # Cached responses are already compressed by the response cache.
+    return compress_response(
+        response, request.headers.get('Accept-Encoding'), current_app.config['COMPRESSION_MIN_SIZE']
+    )
+
+
+@api.before_app_request
+def ensure_database_ready():
+    # The schema is checked on the first request instead of at import time
+    ensure_database(current_app)
+
+
+@api.before_app_request
+def sync_with_other_processes():
+    # Only needed when several processes write to the same database file
+    if request.method != 'GET' or not current_app.config['SYNC_ACROSS_PROCESSES']:
+        return
+    state = cafe_state()
+    version = read_version(db.session)
+    if state.version_watcher.applied_seq is None:
+        state.version_watcher.applied(db.session.execute(latest_change()).scalar())
+    if not state.version_watcher.changed(version):
+        return
+    changes = db.session.execute(changes_after(state.version_watcher.applied_seq, SYNC_MAX_CHANGES + 1)).all()
+    if len(changes) > SYNC_MAX_CHANGES:
+        # Cheaper to reload than to replay, e.g. after a bulk import
+        state.reset()
+        state.version_watcher.applied(db.session.execute(latest_change()).scalar())
+    else:
+        rows = db.session.execute(changed_cafes_query({change.cafe_id for change in changes})).all()
+        apply_logged_changes(changes, rows)
+
+
+def changed_cafes_query(cafe_ids):
+    """Select the `CafeRecord` columns of the cafes that still exist among `cafe_ids`."""
+    return db.select(*catalog_columns(Cafe, cafe_response_columns(Cafe))).where(Cafe.id.in_(cafe_ids))
+
+
+def apply_logged_changes(changes, rows):
+    """
+    Replay changes from the change log into the in-memory indexes and caches.
+
+    Replaying is idempotent, so changes this process already applied when it
+    handled the write, and changes replayed twice by concurrent requests, do
+    no harm.
+
+    Args:
+        changes: (seq, cafe_id, op) rows from `changes_after`, oldest first.
+        rows: The `changed_cafes_query` rows of their cafes.
+    """
+    if not changes:
+        return
+    state = cafe_state()
+    records = {record.id: record for record in (CafeRecord(*row) for row in rows)}
+    snapshot = state.catalog.snapshot
+    tags = set()
+    location_unknown = False
+    upserts, discards = [], []
+    for cafe_id in {change.cafe_id for change in changes}:
+        # The previous location, to drop the cafe's cached searches there
+        previous = snapshot.records.get(cafe_id) if snapshot is not None else None
+        previous_key = state.location_index.forget(cafe_id)
+        if previous is not None:
+            previous_key = previous.location_key
+        state.cafe_fragments.invalidate(cafe_id)
+        record = records.get(cafe_id)
+        if record is None:
+            state.random_index.discard(cafe_id)
+            state.amenity_index.discard(cafe_id)
+            discards.append(cafe_id)
+            location_unknown = location_unknown or (previous is None and previous_key is None)
+        else:
+            state.random_index.add(cafe_id)
+            state.amenity_index.update(record)
+            upserts.append(record)
+            state.location_index.upsert(
+                cafe_id, record.location_key, row_response(record), current_app.json.dumps_bytes
+            )
+            tags |= cafe_tags(cafe_id, record.location_key)
+        if previous_key is not None:
+            tags |= cafe_tags(cafe_id, previous_key)
+    state.catalog.apply(upserts, discards)
+    if location_unknown:
+        # A deleted cafe may still be listed by any cached search
+        state.response_cache.clear()
+    else:
+        state.response_cache.invalidate(tags)
+    state.version_watcher.applied(changes[-1].seq)
+
+
+def random_cafe_query(cafe_id: int, fields=None):
+    """Select the response columns (only `fields` when given) and id of one cafe by primary key."""
+    return db.select(*cafe_response_columns(Cafe, fields), Cafe.id).where(Cafe.id == cafe_id)
+
+
+def list_columns(fields=None):
+    """
+    Select the response columns of `fields` for a list of cafes, followed by
+    the name and id used for cursors and the fragment cache, which are not
+    part of the response.
+    """
+    columns = cafe_response_columns(Cafe, fields)
+    if fields is not None and 'name' not in fields:
+        columns.append(Cafe.name)
+    return [*columns, Cafe.id]
+
+
+def search_criteria(args):
+    """
+    Read and validate the /api/search arguments.
+
+    Args:
+        args: The query arguments: `loc`, `match` and the seat/price range
+            filters and sort order read by `parse_range_filters`. `loc` may be
+            omitted when a range filter is given.
+
+    Returns:
+        A (loc, match, filters) tuple, with `loc` normalized.
+
+    Raises:
+        ValueError: If the parameters are invalid.
+    """
+    loc = normalize_location(args.get('loc'))
+    match = args.get('match', 'exact')
+    filters = parse_range_filters(args)
+    if not loc and len(filters) == 1:
+        raise ValueError("loc cannot be null.")
+    if loc and match not in ('exact', 'prefix'):
+        raise ValueError("match must be 'exact' or 'prefix'.")
+    return loc, match, filters
+
+
+def search_cache_entry(loc, match, filters, fields=None):
+    """Return the response cache key and tags of a search."""
+    key = ('search', match if loc else None, loc, tuple(sorted(filters.items())), fields)
+    if not loc:
+        # Any write can change a search that is not limited to one location
+        return key, {'all'}
+    return key, {f'location:{loc}'} if match == 'exact' else {f'prefix:{loc}'}
+
+
+def is_location_lookup(loc, match, filters, fields=None):
+    """Tell whether a search is a plain exact-location lookup served by `location_index`."""
+    return bool(loc) and match == 'exact' and filters == {'sort': 'name'} and fields is None
+
+
+def location_cafes_query(loc: str):
+    """Select the response columns and id of every cafe in one normalized location."""
+    return db.select(*cafe_response_columns(Cafe), Cafe.id).where(Cafe.location_key == loc)
 
 
-with app.app_context():
-    db.create_all()
+def search_statement(loc, match, filters, fields=None):
+    """Build the /api/search query from the values returned by `search_criteria`."""
+    conditions = []
+    if loc and match == 'exact':
+        conditions.append(Cafe.location_key == loc)
+    elif loc:
+        # Range over the location_key index instead of a LIKE scan
+        conditions.append(Cafe.location_key >= loc)
+        upper = prefix_upper_bound(loc)
+        if upper is not None:
+            conditions.append(Cafe.location_key < upper)
 
+    if 'min_seats' in filters:
+        conditions.append(Cafe.seats_min >= filters['min_seats'])
+    if 'max_seats' in filters:
+        conditions.append(Cafe.seats_max <= filters['max_seats'])
+    if 'min_price' in filters:
+        conditions.append(Cafe.price_minor >= filters['min_price'])
+    if 'max_price' in filters:
+        conditions.append(Cafe.price_minor <= filters['max_price'])
+    if 'currency' in filters:
+        conditions.append(Cafe.price_currency == filters['currency'])
 
-@app.route("/")
+    sort = filters['sort']
+    if sort == 'name':
+        # Plain ORDER BY name lets exact searches read ix_cafe_location_key_name in order
+        order_by = (Cafe.name,)
+    else:
+        sort_column = {'price': Cafe.price_minor, 'seats': Cafe.seats_min}[sort.lstrip('-')]
+        order = sort_column.desc() if sort.startswith('-') else sort_column.asc()
+        order_by = (order.nulls_last(), Cafe.name)
+
+    return db.select(*list_columns(fields)).where(*conditions).order_by(*order_by)
+
+
+def catalog_snapshot():
+    """Return the in-memory catalog, loading it from the database on first use."""
+    return cafe_state().catalog.load(lambda: db.session.execute(db.select(*catalog_columns(Cafe, cafe_response_columns(Cafe)))).all())
+
+
+@api.route("/")
 def home():
     return render_template("index.html")
 
 
+def _single_cafe_response(cafe, fields=None):
+    # Random picks rarely repeat, so they skip the response cache and only reuse the cafe's fragment
+    if fields is None:
+        body = wrap_cafe(cafe_state().cafe_fragments.join([cafe], current_app.json.dumps_bytes))
+        return current_app.response_class(body, mimetype='application/json'), 200
+    # Use Response Model for GET Request Output
+    return jsonify(cafe=row_response(cafe, fields)), 200
+
+
+def _random_cafe_response(cafe_id: int, fields=None):
+    # Returns None if the id was removed by another process
+    random_cafe = db.session.execute(random_cafe_query(cafe_id, fields)).first()
+    if random_cafe is None:
+        return None
+    return _single_cafe_response(random_cafe, fields)
+
 # HTTP GET - Read Record
-@app.route('/api/random', methods=['GET'])
+@api.route('/api/random', methods=['GET'])
 def random_cafe():
     """
     Get a random cafe from the database.
 
+    Parameters:
+    - fields (str, optional): Comma-separated response keys to return, e.g. "name,location".
+      Only those columns are read from the database.
+
     Returns:
         - If a random cafe is found in the database, returns a JSON response with the cafe details.
         - If no cafes are found in the database, returns a JSON response with an error message and a 404 status code.
     """
-    random_cafe = db.session.execute(db.select(Cafe).order_by(db.func.random())).scalars().first()
-    if random_cafe is None:
-        return jsonify(error={"Not Found": "No cafes found in the database"}), 404
-    else:
-        # Use Response Model for GET Request Output
-        return jsonify(cafe=get_cafe_response(random_cafe)), 200
+    try:
+        fields = parse_fields(request.args)
+    except ValueError as error:
+        return jsonify(error={"error": str(error)}), 400
+
+    if current_app.config['CATALOG_ENABLED']:
+        record = catalog_snapshot().choice()
+        if record is None:
+            return jsonify(error={"Not Found": "No cafes found in the database"}), 404
+        return _single_cafe_response(record, fields)
+
+    random_index = cafe_state().random_index
+    while not random_index.loaded:
+        # Read again if a write landed while the ids were being read
+        generation = random_index.generation
+        random_index.load(db.session.execute(db.select(Cafe.id)).scalars(), generation)
+
+    # Pick an id from the index and fetch the row by primary key.
+    # Ids removed by another process are dropped and another id is tried.
+    while (cafe_id := random_index.choice()) is not None:
+        response = _random_cafe_response(cafe_id, fields)
+        if response is not None:
+            return response
+        random_index.discard(cafe_id)
+
+    return jsonify(error={"Not Found": "No cafes found in the database"}), 404
     
 # HTTP GET - Read All Records
-@app.route('/api/all', methods=['GET'])
+@api.route('/api/all', methods=['GET'])
 def all_cafes():
     """
     Get all cafes from the database.
 
+    Parameters:
+    - limit (int, optional): Page size for keyset pagination.
+    - cursor (str, optional): The `next_cursor` value returned by the previous page.
+    - stream (bool, optional): Stream the JSON array row by row instead of building it in memory.
+    - fields (str, optional): Comma-separated response keys to return, e.g. "name,location".
+      Only those columns are read from the database.
+
+    Returns:
+        A JSON response containing information about all cafes. When `limit` or
+        `cursor` is given, only one page is returned together with a `next_cursor`.
+    """
+    state = cafe_state()
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    try:
+        limit, after = parse_page_args(request.args)
+        fields = parse_fields(request.args)
+    except ValueError as error:
+        return jsonify(error={"error": str(error)}), 400
+    stmt = db.select(*list_columns(fields)).order_by(Cafe.name, Cafe.id)
+    if after:
+        stmt = stmt.where(tuple_(Cafe.name, Cafe.id) > tuple_(*after))
+
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        if paginated:
+            stmt = stmt.limit(limit)
+        return stream_response(db.session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE)), fields)
+
+    if current_app.config['CATALOG_ENABLED']:
+        if paginated:
+            return state.response_cache.get_or_build(
+                ('all', limit, after, fields), {'all'},
+                lambda: page_response(catalog_snapshot().page(limit, after), limit, state.cafe_fragments, fields),
+            )
+        return state.response_cache.get_or_build(
+            ('all', fields), {'all'}, lambda: many_responses(catalog_snapshot().ordered, state.cafe_fragments, fields)
+        )
+
+    if paginated:
+        return state.response_cache.get_or_build(
+            ('all', limit, after, fields), {'all'},
+            lambda: page_response(db.session.execute(stmt.limit(limit + 1)).all(), limit, state.cafe_fragments, fields),
+        )
+
+    return state.response_cache.get_or_build(
+        ('all', fields), {'all'}, lambda: many_responses(db.session.execute(stmt), state.cafe_fragments, fields)
+    )
+
+# HTTP GET - Read Change Feed
+@api.route('/api/changes', methods=['GET'])
+def cafe_changes():
+    """
+    List the cafes added, updated or deleted since a sequence number.
+
+    Consumers keep a mirror in sync by storing `next_since` and passing it back
+    as `since`, so each call only costs as much as the changes it returns.
+    Several changes to one cafe are collapsed into its latest state.
+
+    Parameters:
+    - since (int, optional): The last sequence number applied, 0 (default) for everything.
+    - limit (int, optional): The maximum number of changes per response.
+
+    Returns:
+    - A JSON response with a `changes` list of {seq, id, op, cafe} objects, where
+      `op` is 'upsert' with the current cafe or 'delete' with `cafe` null, the
+      `next_since` value to pass next, and `has_more` if another page is waiting.
+    """
+    try:
+        since = parse_since(request.args)
+        limit, _ = parse_page_args(request.args)
+    except ValueError as error:
+        return jsonify(error={"error": str(error)}), 400
+
+    def build():
+        changed = db.session.execute(changes_since(since, limit + 1)).all()
+        page = changed[:limit]
+        rows = db.session.execute(
+            db.select(*cafe_response_columns(Cafe), Cafe.id).where(Cafe.id.in_([change.cafe_id for change in page]))
+        )
+        # The id is selected last and is not part of the cafe response
+        cafes = {row[-1]: row_response(row) for row in rows}
+        changes = [
+            {
+                'seq': change.seq,
+                'id': change.cafe_id,
+                'op': 'upsert' if change.cafe_id in cafes else 'delete',
+                'cafe': cafes.get(change.cafe_id),
+            }
+            for change in page
+        ]
+        next_since = page[-1].seq if page else since
+        return jsonify(changes=changes, next_since=next_since, has_more=len(changed) > limit), 200
+
+    return cafe_state().response_cache.get_or_build(('changes', since, limit), {'all'}, build)
+
+class ChangeFeed:
+    """
+    Reads the cafe_change log for `event_broker`, outside of any request.
+
+    Changes are returned as /api/stream events: 'upsert' with the current
+    cafe, or 'delete' when the cafe no longer exists, as in /api/changes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def latest(self):
+        with self.app.app_context():
+            return db.session.execute(latest_change()).scalar()
+
+    def read(self, since, limit):
+        with self.app.app_context():
+            changes = db.session.execute(changes_after(since, limit)).all()
+            rows = db.session.execute(
+                db.select(*cafe_response_columns(Cafe), Cafe.id)
+                .where(Cafe.id.in_({change.cafe_id for change in changes}))
+            )
+            # The id is selected last and is not part of the cafe response
+            cafes = {row[-1]: row_response(row) for row in rows}
+        events = []
+        for change in changes:
+            cafe = cafes.get(change.cafe_id) if change.op != 'delete' else None
+            if cafe is None:
+                events.append((change.seq, 'delete', {'id': change.cafe_id}))
+            else:
+                events.append((change.seq, 'upsert', {'id': change.cafe_id, 'cafe': cafe}))
+        return events
+
+# HTTP GET - Live Change Events
+@api.route('/api/stream', methods=['GET'])
+def cafe_event_stream():
+    """
+    Stream cafe changes as Server-Sent Events.
+
+    Events are read from the change log, so writes made by every process are
+    pushed. Each event's id is its /api/changes sequence number, and its data is
+    {id, cafe} for 'upsert' or {id} for 'delete'. A reconnecting client sends
+    Last-Event-ID and receives the events it missed. A client that missed
+    more than fits in its queue, or falls too far behind, gets a 'resync'
+    event (or is disconnected) and should catch up through /api/changes
+    before reconnecting.
+
+    Parameters:
+    - since (int, optional): A sequence number to resume from, for clients that
+      cannot send the Last-Event-ID header.
+
+    Returns:
+    - A text/event-stream response, 400 for an invalid Last-Event-ID, or 503 if
+      the subscriber limit is reached.
+    """
+    try:
+        last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    except ValueError as error:
+        return jsonify(error={"error": str(error)}), 400
+    event_broker = cafe_state().event_broker
+    try:
+        subscription = event_broker.subscribe(ChangeFeed(current_app._get_current_object()), last_event_id)
+    except SubscriberLimitReached:
+        return jsonify(error={"error": "Too many open streams, try again later."}), 503
+    return event_stream_response(event_broker, subscription)
+
+# HTTP GET - Metrics
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Expose request, database and cache metrics in the Prometheus text format.
+
     Returns:
-        A JSON response containing information about all cafes.
+    - A text/plain response listing latency, response size and per-request query
+      histograms by route, response cache hits and misses by endpoint, and the
+      current cache size and number of open event streams.
     """
-    all_cafes = db.session.execute(db.select(Cafe).order_by(Cafe.name)).scalars()
-    return many_responses(all_cafes)
+    state = cafe_state()
+    body = state.request_metrics.render(
+        cache_stats=state.response_cache.stats(),
+        gauges={
+            'cafe_response_cache_entries': ('Responses held in the cache.', len(state.response_cache)),
+            'cafe_response_cache_bytes': (
+                'Bytes held by cached responses and their compressed copies.', state.response_cache.size_bytes,
+            ),
+            'cafe_event_stream_subscribers': ('Open /api/stream connections.', len(state.event_broker)),
+        },
+    )
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 # HTTP GET - Find A Record
-@app.route('/api/search', methods=['GET'])
+@api.route('/api/search', methods=['GET'])
 def search_cafe():
     """
     Searches for cafes based on the provided location.
 
     Parameters:
-    - loc (str): The location to search for cafes.
+    - loc (str): The location to search for cafes. Matching ignores case and extra whitespace.
+      Optional when a range filter is given.
+    - match (str, optional): 'exact' (default) or 'prefix' to match every location starting with `loc`.
+    - min_seats, max_seats (int, optional): Only cafes whose seating range lies within these bounds.
+    - min_price, max_price (float, optional): Coffee price bounds in major units, e.g. 2.50.
+    - currency (str, optional): Only cafes pricing in this ISO 4217 currency, e.g. GBP.
+      Required with min_price, max_price or a price sort.
+    - sort (str, optional): 'name' (default), 'price', '-price', 'seats' or '-seats'.
+    - fields (str, optional): Comma-separated response keys to return, e.g. "name,location".
+      Only those columns are read from the database.
 
     Returns:
     - str: A JSON response containing information about the cafes found.
@@ -149,12 +698,175 @@ def search_cafe():
             ]
         }
     """
-    loc = request.args.get('loc')
-    all_cafes = Cafe.query.filter_by(location = loc).order_by(Cafe.name).all()
-    return many_responses(all_cafes)
+    try:
+        loc, match, filters = search_criteria(request.args)
+        fields = parse_fields(request.args)
+    except ValueError as error:
+        return jsonify(error={"error": str(error)}), 400
+    key, tags = search_cache_entry(loc, match, filters, fields)
+    state = cafe_state()
+
+    if is_location_lookup(loc, match, filters, fields):
+        build = lambda: _location_search_response(loc)
+    elif current_app.config['CATALOG_ENABLED']:
+        build = lambda: many_responses(catalog_snapshot().search(loc, match, filters), state.cafe_fragments, fields)
+    else:
+        build = lambda: many_responses(
+            db.session.execute(search_statement(loc, match, filters, fields)).all(), state.cafe_fragments, fields
+        )
+    return state.response_cache.get_or_build(key, tags, build)
+
+
+def _location_search_response(loc: str):
+    # A dict lookup when the location is loaded, one indexed query otherwise
+    location_index = cafe_state().location_index
+    fragment = location_index.get(loc)
+    if fragment is None:
+        generation = location_index.generation
+        rows = db.session.execute(location_cafes_query(loc)).all()
+        fragment = location_index.install(
+            loc, ((row.id, row_response(row)) for row in rows), current_app.json.dumps_bytes, generation
+        )
+    if not fragment:
+        return jsonify(error={"Not Found": "No cafes found in the database"}), 404
+    return current_app.response_class(wrap_cafes(fragment), mimetype='application/json'), 200
+
+# HTTP GET - Full-Text Search
+@api.route('/api/search/text', methods=['GET'])
+def search_text():
+    """
+    Search cafes by name and location using the FTS5 index.
+
+    Parameters:
+    - q (str): The search text. The last word is matched as a prefix, so "flat wh" finds "Flat White".
+    - limit (int, optional): Page size, 100 by default.
+    - offset (int, optional): Number of ranked results to skip.
+
+    Returns:
+    - A JSON response with the matching cafes ordered by relevance, and the
+      `next_offset` of the following page if there are more results.
+    """
+    if not current_app.config['FULLTEXT_ENABLED']:
+        return jsonify(error={"error": "Full-text search is not available."}), 503
+
+    match_query = build_match_query(request.args.get('q'))
+    if match_query is None:
+        return jsonify(error={"error": "q cannot be null."}), 400
+
+    try:
+        limit, _ = parse_page_args(request.args)
+        offset = parse_offset(request.args)
+    except ValueError as error:
+        return jsonify(error={"error": str(error)}), 400
+
+    stmt = (
+        db.select(*cafe_response_columns(Cafe))
+        .join(cafe_fts, cafe_fts.c.rowid == Cafe.id)
+        .where(fulltext_condition(match_query))
+        .order_by(cafe_fts.c.rank)
+        .limit(limit + 1)
+        .offset(offset)
+    )
+    found = db.session.execute(stmt).all()
+    next_offset = offset + limit if len(found) > limit else None
+    return jsonify(cafes=[row_response(cafe) for cafe in found[:limit]], next_offset=next_offset), 200
+
+# HTTP GET - Filter By Amenities
+@api.route('/api/filter', methods=['GET'])
+def filter_cafes():
+    """
+    Find cafes by any combination of amenities.
+
+    Parameters:
+    - toilet, wifi, sockets, calls (bool, optional): Require the amenity (true/1/yes)
+      or its absence (false/0/no). Omitted amenities are not filtered on.
+    - limit (int, optional): Page size, 100 by default.
+    - offset (int, optional): Number of matching cafes to skip.
+
+    Returns:
+    - A JSON response with the matching cafes ordered by id, the total `count`
+      and the `next_offset` of the following page if there are more results.
+    """
+    try:
+        filters = parse_amenity_filters(request.args)
+        limit, _ = parse_page_args(request.args)
+        offset = parse_offset(request.args)
+    except ValueError as error:
+        return jsonify(error={"error": str(error)}), 400
+
+    columns = [getattr(Cafe, column) for column in AMENITIES.values()]
+    amenity_index = cafe_state().amenity_index
+    while not amenity_index.loaded:
+        # Read again if a write landed while the rows were being read
+        generation = amenity_index.generation
+        amenity_index.load(db.session.execute(db.select(Cafe.id, *columns)), generation)
+
+    bits = amenity_index.match(filters)
+    count = bits.bit_count()
+    ids = bitset_ids(bits, offset=offset, limit=limit)
+    stmt = db.select(*cafe_response_columns(Cafe)).where(Cafe.id.in_(ids)).order_by(Cafe.id)
+    found = db.session.execute(stmt).all() if ids else []
+    next_offset = offset + limit if offset + limit < count else None
+    return jsonify(cafes=[row_response(cafe) for cafe in found], count=count, next_offset=next_offset), 200
+
+# HTTP GET - Find Nearby Records
+@api.route('/api/nearby', methods=['GET'])
+def nearby_cafes():
+    """
+    Find cafes near a point, nearest first.
+
+    Only cafes whose map_url contains coordinates can be found. Candidates are
+    read through the R*Tree spatial index (or the latitude/longitude index when
+    SQLite lacks R*Tree), so only the neighbourhood of the point is scanned.
+
+    Parameters:
+    - lat (float): The latitude of the point.
+    - lng (float): The longitude of the point.
+    - radius (float, optional): The search radius in kilometres.
+    - k (int, optional): Return at most the k nearest cafes. Defaults to 10 without a radius
+      and to the maximum page size with one.
+
+    Returns:
+    - A JSON response with the matching cafes, each with its `distance_km` from the point.
+    """
+    try:
+        latitude = float(request.args['lat'])
+        longitude = float(request.args['lng'])
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError
+    except (KeyError, ValueError):
+        return jsonify(error={"error": "lat and lng must be valid coordinates."}), 400
+
+    try:
+        radius = request.args.get('radius')
+        radius = float(radius) if radius is not None else None
+        if radius is not None and not radius > 0:
+            raise ValueError
+    except ValueError:
+        return jsonify(error={"error": "radius must be a positive number of kilometres."}), 400
+
+    try:
+        k = request.args.get('k')
+        k = int(k) if k is not None else (MAX_PAGE_SIZE if radius is not None else 10)
+        if k is not None and not 1 <= k <= MAX_PAGE_SIZE:
+            raise ValueError
+    except ValueError:
+        return jsonify(error={"error": f"k must be between 1 and {MAX_PAGE_SIZE}."}), 400
+
+    use_rtree = current_app.config['SPATIAL_INDEX_ENABLED']
+    stmt = db.select(*cafe_response_columns(Cafe), Cafe.latitude, Cafe.longitude)
+    if use_rtree:
+        stmt = stmt.join(cafe_rtree, cafe_rtree.c.id == Cafe.id)
+
+    def fetch(boxes):
+        return db.session.execute(stmt.where(box_condition(boxes, use_rtree, Cafe.latitude, Cafe.longitude)))
+
+    found = nearest(fetch, latitude, longitude, radius_km=radius, k=k)
+    cafes = [dict(row_response(row), distance_km=round(distance, 3)) for distance, row in found]
+    return jsonify(cafes=cafes), 200
 
 # HTTP POST - Create Record
-@app.route('/api/add', methods=['POST'])
+@api.route('/api/add', methods=['POST'])
 def add_cafe():
     """
     Add a new cafe to the database.
@@ -187,6 +899,14 @@ def add_cafe():
         new_cafe = new_cafe_check(Cafe)
         db.session.add(new_cafe)
         db.session.commit()
+        state = cafe_state()
+        state.random_index.add(new_cafe.id)
+        state.amenity_index.update(new_cafe)
+        state.catalog.upsert(record_from_model(new_cafe))
+        state.cafe_fragments.invalidate(new_cafe.id)
+        state.location_index.upsert(new_cafe.id, new_cafe.location_key, get_cafe_response(new_cafe), current_app.json.dumps_bytes)
+        state.response_cache.invalidate(cafe_tags(new_cafe.id, new_cafe.location_key))
+        state.event_broker.notify()
         return jsonify(success={"success": "Successfully added the new cafe"}), 200
     
     except (Exception, IntegrityError) as error:
@@ -204,8 +924,97 @@ def add_cafe():
         # Optional: Close DB connection or perform cleanup actions
         db.session.close()
         
+def _run_bulk_import(records, batch_size: int):
+    """
+    Insert cafes from `records` in one transaction and refresh the in-memory
+    indexes and response cache.
+
+    Returns:
+        An (inserted, errors) tuple as returned by `import_cafes`.
+    """
+    try:
+        inserted, errors = import_cafes(db.session, Cafe, records, batch_size)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+
+    if inserted:
+        # Too many cafes to invalidate one by one, rebuild on next use instead
+        state = cafe_state()
+        state.reset()
+        state.event_broker.notify()
+    return inserted, errors
+
+# HTTP POST - Create Records In Bulk
+@api.route('/api/bulk-add', methods=['POST'])
+def bulk_add_cafes():
+    """
+    Add many cafes in one request from a JSON Lines or CSV upload.
+
+    The data is sent either as the raw request body or as a multipart `file` field.
+    Each record uses the same field names as /api/add (name, map_url, img_url, loc,
+    seats, coffee_price, sockets, toilet, wifi, calls). Valid rows are inserted in
+    batches within a single transaction, and invalid rows are skipped and reported.
+
+    Parameters:
+    - api-key (str): The API key.
+    - format (str, optional): 'jsonl' or 'csv'. Guessed from the file name or Content-Type if omitted.
+    - batch_size (int, optional): Rows per INSERT statement.
+
+    Returns:
+    - A JSON response with the number of inserted and failed rows, and an `errors`
+      list giving the line, name and error message of every rejected row.
+    """
+    api_key = request.args.get('api-key')
+    if not api_key or api_key != current_app.config['SECRET_API']:
+        return jsonify(error={"error": "Not Authorized to perform this action."}), 403
+
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    fmt = request.args.get('format') or detect_format(upload.filename if upload else None, request.mimetype)
+    try:
+        batch_size = int(request.args.get('batch_size', current_app.config['BULK_BATCH_SIZE']))
+        if batch_size < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify(error={"error": "batch_size must be a positive integer."}), 400
+
+    try:
+        inserted, errors = _run_bulk_import(iter_records(stream, fmt), batch_size)
+    except BulkImportError as error:
+        return jsonify(error={"error": str(error)}), 400
+    except Exception:
+        return jsonify(error={'error': 'Error writing to database'}), 400
+
+    return jsonify(success={"inserted": inserted, "failed": len(errors)}, errors=errors), 200
+
+@api.cli.command('import-cafes')
+@click.argument('path', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Input format, guessed from the file name if omitted.')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, type=click.IntRange(min=1), help='Rows per INSERT statement.')
+def import_cafes_command(path, fmt, batch_size):
+    """
+    Bulk import cafes from a JSON Lines or CSV file.
+
+    Example:
+        flask --app main import-cafes cafes.csv --batch-size 1000
+    """
+    ensure_database(current_app)
+    fmt = fmt or detect_format(path.name)
+    try:
+        inserted, errors = _run_bulk_import(iter_records(path, fmt), batch_size)
+    except BulkImportError as error:
+        raise click.ClickException(str(error))
+
+    for error in errors:
+        click.echo(f"line {error['line']}: {error['error']} ({error['name']})", err=True)
+    click.echo(f"Inserted {inserted} cafes, {len(errors)} rows failed.")
+
 # HTTP PUT/PATCH - Update Record
-@app.route('/api/update-price/<int:cafe_id>', methods=['PATCH'])
+@api.route('/api/update-price/<int:cafe_id>', methods=['PATCH'])
 def update_price(cafe_id: int):
     """
     Update the coffee price for a specific cafe.
@@ -227,7 +1036,19 @@ def update_price(cafe_id: int):
         # Update coffee_price and commit
         try:
             cafe_query.coffee_price = request.args.get('new_price')
+            location_key = cafe_query.location_key
+            price_minor, price_currency = cafe_query.price_minor, cafe_query.price_currency
             db.session.commit()
+            state = cafe_state()
+            state.catalog.update(
+                cafe_id, coffee_price=request.args.get('new_price'), price_minor=price_minor, price_currency=price_currency
+            )
+            state.cafe_fragments.invalidate(cafe_id)
+            state.location_index.update(
+                cafe_id, location_key, {'coffee_price': request.args.get('new_price')}, current_app.json.dumps_bytes
+            )
+            state.response_cache.invalidate(cafe_tags(cafe_id, location_key))
+            state.event_broker.notify()
             return jsonify(success={"success": "Successfully added the new cafe"}), 200
         
         # Check for Exceptions if any
@@ -246,23 +1067,237 @@ def update_price(cafe_id: int):
             # Close DB connection or perform cleanup actions
             db.session.close()
             
+# HTTP PATCH - Update Records In Bulk
+@api.route('/api/update-price', methods=['PATCH'])
+def update_prices_batch():
+    """
+    Update the coffee price of many cafes in one request.
+
+    The body is a JSON array of {"id": int, "coffee_price": str} objects. All
+    prices are applied with set-based UPDATEs in a single transaction; ids that
+    do not exist are skipped and reported.
+
+    Returns:
+    - A JSON response with the number of updated cafes and the list of missing ids.
+    """
+    try:
+        prices = parse_price_updates(request.get_json(silent=True))
+    except ValueError as error:
+        return jsonify(error={"error": str(error)}), 400
+
+    try:
+        updated, missing = update_prices(db.session, Cafe, prices)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return jsonify(error={'error': 'Error writing to database'}), 400
+    finally:
+        db.session.close()
+
+    if updated:
+        state = cafe_state()
+        tags = set()
+        catalog_updates = {}
+        for cafe_id, location_key in updated.items():
+            tags |= cafe_tags(cafe_id, location_key)
+            price_minor, price_currency = parse_price(prices[cafe_id])
+            catalog_updates[cafe_id] = {
+                'coffee_price': prices[cafe_id], 'price_minor': price_minor, 'price_currency': price_currency,
+            }
+            state.location_index.update(cafe_id, location_key, {'coffee_price': prices[cafe_id]}, current_app.json.dumps_bytes)
+            state.cafe_fragments.invalidate(cafe_id)
+        # One new catalog snapshot for the whole batch
+        state.catalog.apply(updates=catalog_updates)
+        state.response_cache.invalidate(tags)
+        state.event_broker.notify()
+    return jsonify(updated=len(updated), missing=missing), 200
+
 # HTTP DELETE - Delete Record
-@app.route('/api/report-closed/<int:cafe_id>', methods=['DELETE'])
+@api.route('/api/report-closed/<int:cafe_id>', methods=['DELETE'])
 def delete_cafe(cafe_id: int):
     # Check if new_price is null
     api_key = request.args.get('api-key')
-    if not api_key or api_key != SECRET_API:
+    if not api_key or api_key != current_app.config['SECRET_API']:
         return jsonify(error={"error": "Not Authorized to perform this action."}), 403
     
     # Query cafe_id return 404 with message if not found.
     cafe_query = db.get_or_404(Cafe, cafe_id, description='This ID Does not Exist.')
     if cafe_query:
         # Update coffee_price and commit
+        location_key = cafe_query.location_key
         db.session.delete(cafe_query)
         db.session.commit()
+        state = cafe_state()
+        state.random_index.discard(cafe_id)
+        state.amenity_index.discard(cafe_id)
+        state.catalog.discard(cafe_id)
+        state.location_index.discard(cafe_id, location_key)
+        state.cafe_fragments.invalidate(cafe_id)
+        state.response_cache.invalidate(cafe_tags(cafe_id, location_key))
+        state.event_broker.notify()
         # Close DB connection or perform cleanup actions
         db.session.close()
         return jsonify(success={"success": "Successfully added the new cafe"}), 200
 
+def ensure_database(app: Flask):
+    """
+    Run `setup_database` once per application, the first time it is needed.
+
+    When SCHEMA_PREPARED is set, a launcher such as serve.py has already run
+    it, and only the optional indexes it created are looked up, so worker
+    processes never repeat the migration.
+
+    Args:
+        app: The Flask application.
+    """
+    if app.extensions.get('cafe_database_ready'):
+        return
+    with _setup_lock:
+        if not app.extensions.get('cafe_database_ready'):
+            if app.config['SCHEMA_PREPARED']:
+                read_prepared_schema(app)
+            else:
+                setup_database(app)
+            app.extensions['cafe_database_ready'] = True
+
+
+def read_prepared_schema(app: Flask):
+    """
+    Enable the full-text and spatial routes if `setup_database` could create
+    their indexes, without any DDL.
+
+    Args:
+        app: The Flask application whose database was prepared by another process.
+    """
+    with app.app_context(), db.engine.connect() as connection:
+        tables = set(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+    app.config['FULLTEXT_ENABLED'] = FTS_TABLE in tables
+    app.config['SPATIAL_INDEX_ENABLED'] = RTREE_TABLE in tables
+
+
+def setup_database(app: Flask):
+    """
+    Create the tables, add columns missing from older databases, backfill
+    derived columns and create the FTS, write-version and change log triggers.
+
+    Args:
+        app: The Flask application whose database should be prepared.
+    """
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            added = add_missing_columns(connection, Cafe.__table__)
+            backfill_columns(
+                connection,
+                Cafe.__table__,
+                sources=[Cafe.__table__.c.location],
+                compute=lambda row: {'location_key': normalize_location(row.location)},
+                where=Cafe.__table__.c.location_key.is_(None),
+            )
+            if 'latitude' in added:
+                # Most map URLs carry no coordinates, so only parse them once when the columns appear
+                backfill_columns(
+                    connection,
+                    Cafe.__table__,
+                    sources=[Cafe.__table__.c.map_url],
+                    compute=lambda row: dict(zip(('latitude', 'longitude'), parse_coordinates(row.map_url))),
+                    where=Cafe.__table__.c.map_url.is_not(None),
+                )
+            if 'price_minor' in added:
+                backfill_columns(
+                    connection,
+                    Cafe.__table__,
+                    sources=[Cafe.__table__.c.seats, Cafe.__table__.c.coffee_price],
+                    compute=lambda row: {
+                        **dict(zip(('seats_min', 'seats_max'), parse_seats(row.seats))),
+                        **dict(zip(('price_minor', 'price_currency'), parse_price(row.coffee_price))),
+                    },
+                    where=Cafe.__table__.c.seats.is_not(None) | Cafe.__table__.c.coffee_price.is_not(None),
+                )
+            app.config['FULLTEXT_ENABLED'] = create_fulltext_index(connection)
+            app.config['SPATIAL_INDEX_ENABLED'] = create_spatial_index(connection)
+            create_version_table(connection)
+            create_change_log(connection)
+
+
+def create_app(config: dict | None = None) -> Flask:
+    """
+    Create and configure the Flask application.
+
+    Settings are read from the environment (or a .env file when python-dotenv
+    is installed) and can be overridden with `config`. No database work is
+    done here: the schema is created or migrated by `ensure_database` on the
+    first request, or explicitly with `flask --app main init-db`. Each
+    application gets its own in-memory indexes and caches, see `CafeState`.
+
+    Args:
+        config: Optional configuration overrides, for example
+            {'SQLALCHEMY_DATABASE_URI': 'sqlite:///other.db'}.
+
+    Returns:
+        The configured Flask application.
+    """
+    try:
+        from dotenv import load_dotenv
+    except ImportError:  # .env support is optional
+        pass
+    else:
+        # loading variables from .env file
+        load_dotenv()
+
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+
+    app.config['SECRET_API'] = getenv('SECRET_API')
+    # Connect to Database
+    app.config['SQLALCHEMY_DATABASE_URI'] = getenv('DATABASE_URL', 'sqlite:///cafes.db')
+    app.config['SQLITE_PROFILE'] = getenv('SQLITE_PROFILE', 'wal')
+    app.config['DB_POOL_SIZE'] = int(getenv('DB_POOL_SIZE', 5))
+    app.config['DB_MAX_OVERFLOW'] = int(getenv('DB_MAX_OVERFLOW', 10))
+    app.config['RESPONSE_CACHE_SIZE'] = int(getenv('RESPONSE_CACHE_SIZE', 1024))
+    app.config['RESPONSE_CACHE_BYTES'] = int(getenv('RESPONSE_CACHE_BYTES', DEFAULT_MAX_BYTES))
+    # Responses smaller than this many bytes are never compressed, 'off' disables compression
+    compression_min_size = getenv('COMPRESSION_MIN_SIZE', str(DEFAULT_MIN_SIZE))
+    app.config['COMPRESSION_MIN_SIZE'] = None if compression_min_size.lower() == 'off' else int(compression_min_size)
+    app.config['BULK_BATCH_SIZE'] = int(getenv('BULK_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+    app.config['SSE_QUEUE_SIZE'] = int(getenv('SSE_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+    app.config['SSE_MAX_SUBSCRIBERS'] = int(getenv('SSE_MAX_SUBSCRIBERS', DEFAULT_MAX_SUBSCRIBERS))
+    app.config['SSE_POLL_INTERVAL'] = float(getenv('SSE_POLL_INTERVAL', DEFAULT_POLL_INTERVAL))
+    # Opt-in: log statements slower than this many milliseconds with their query plan
+    app.config['SLOW_QUERY_MS'] = float(getenv('SLOW_QUERY_MS')) if getenv('SLOW_QUERY_MS') else None
+    app.config['LOCATION_INDEX_SIZE'] = int(getenv('LOCATION_INDEX_SIZE', DEFAULT_MAX_LOCATIONS))
+    app.config['FRAGMENT_CACHE_SIZE'] = int(getenv('FRAGMENT_CACHE_SIZE', DEFAULT_MAX_FRAGMENTS))
+    app.config['CATALOG_ENABLED'] = getenv('CATALOG_ENABLED', '').lower() in ('1', 'true', 'yes')
+    app.config['SYNC_ACROSS_PROCESSES'] = getenv('SYNC_ACROSS_PROCESSES', '').lower() in ('1', 'true', 'yes')
+    # Set by launchers that already ran setup_database, see ensure_database
+    app.config['SCHEMA_PREPARED'] = getenv('SCHEMA_PREPARED', '').lower() in ('1', 'true', 'yes')
+    app.config['FULLTEXT_ENABLED'] = False
+    app.config['SPATIAL_INDEX_ENABLED'] = False
+    app.config.update(config or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        profile=app.config['SQLITE_PROFILE'],
+        pool_size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_MAX_OVERFLOW'],
+    )
+
+    db.init_app(app)
+    with app.app_context():
+        install_pragmas(db.engine, app.config['SQLITE_PROFILE'])
+        install_query_events(db.engine)
+        if app.config['SLOW_QUERY_MS'] is not None:
+            install_slow_query_log(db.engine, app.config['SLOW_QUERY_MS'])
+    app.extensions['cafe'] = CafeState(app.config)
+
+    app.register_blueprint(api)
+    return app
+
+
+@api.cli.command('init-db')
+def init_db_command():
+    """Create or migrate the database schema."""
+    ensure_database(current_app)
+    click.echo('Database is ready.')
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
+    create_app().run(debug=True, port=5001)
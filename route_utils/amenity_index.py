@@ -0,0 +1,161 @@
+from route_utils.generation import GenerationGuard
+
+# Query parameter name -> Cafe column, matching the form fields used by /api/add
+AMENITIES = {
+    "toilet": "has_toilet",
+    "wifi": "has_wifi",
+    "sockets": "has_sockets",
+    "calls": "can_take_calls",
+}
+
+
+class AmenityBitmapIndex(GenerationGuard):
+    """
+    An in-process bitmap index of cafe ids per amenity.
+
+    Each amenity is a Python int used as a bitset where bit `n` is set when the
+    cafe with id `n` has that amenity. A second bitset tracks every live cafe so
+    negative filters ("no calls") are a bitwise AND with the complement.
+    Multi-amenity queries are therefore a handful of bitwise operations.
+
+    The index is loaded lazily from the database on first use and is then kept
+    up to date by the write routes through `update` and `discard`. A load that
+    raced with one of those writes is refused, see `GenerationGuard`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._all = 0
+        self._bitmaps = {column: 0 for column in AMENITIES.values()}
+        self._loaded = False
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def reset(self):
+        """Forget the contents of the index so it is reloaded on next use."""
+        with self._writing():
+            self._all = 0
+            self._bitmaps = {column: 0 for column in AMENITIES.values()}
+            self._loaded = False
+
+    def load(self, rows, generation):
+        """
+        Replace the contents of the index, unless a write happened since
+        `generation` was read.
+
+        Args:
+            rows: An iterable of rows with an `id` and one attribute per amenity column.
+            generation: The `generation` read before querying `rows`.
+
+        Returns:
+            True if the rows were installed, False if they may be stale and
+            should be read again.
+        """
+        all_bits = 0
+        bitmaps = {column: 0 for column in AMENITIES.values()}
+        for row in rows:
+            bit = 1 << row.id
+            all_bits |= bit
+            for column in bitmaps:
+                if getattr(row, column):
+                    bitmaps[column] |= bit
+        with self._installing(generation) as current:
+            if not current:
+                return False
+            self._all = all_bits
+            self._bitmaps = bitmaps
+            self._loaded = True
+            return True
+
+    def update(self, cafe):
+        """Set the amenity bits of a created or changed cafe."""
+        bit = 1 << cafe.id
+        with self._writing():
+            if not self._loaded:
+                return
+            self._all |= bit
+            for column in self._bitmaps:
+                if getattr(cafe, column):
+                    self._bitmaps[column] |= bit
+                else:
+                    self._bitmaps[column] &= ~bit
+
+    def discard(self, cafe_id):
+        """Clear every bit of a deleted cafe."""
+        mask = ~(1 << cafe_id)
+        with self._writing():
+            self._all &= mask
+            for column in self._bitmaps:
+                self._bitmaps[column] &= mask
+
+    def match(self, filters):
+        """
+        Combine the bitmaps for the requested amenities.
+
+        Args:
+            filters: A dict of amenity column to the required boolean value.
+
+        Returns:
+            A bitset of the matching cafe ids.
+        """
+        with self._lock:
+            bits = self._all
+            for column, wanted in filters.items():
+                bitmap = self._bitmaps[column]
+                bits &= bitmap if wanted else ~bitmap
+        return bits
+
+
+def bitset_ids(bits, offset=0, limit=None):
+    """
+    List the ids set in a bitset, in ascending order.
+
+    The bitset is rendered once as a binary string so finding each set bit is a
+    C-level `str.find` instead of big-integer arithmetic per id.
+
+    Args:
+        bits: The bitset.
+        offset: The number of matching ids to skip.
+        limit: The maximum number of ids to return, or None for all of them.
+
+    Returns:
+        A list of cafe ids.
+    """
+    digits = bin(bits)[:1:-1]  # least significant bit first
+    ids = []
+    position = digits.find("1")
+    skipped = 0
+    while position != -1 and (limit is None or len(ids) < limit):
+        if skipped < offset:
+            skipped += 1
+        else:
+            ids.append(position)
+        position = digits.find("1", position + 1)
+    return ids
+
+
+def parse_amenity_filters(args):
+    """
+    Read amenity flags such as `wifi=1&calls=0` from the query arguments.
+
+    Returns:
+        A dict of amenity column to the required boolean value.
+
+    Raises:
+        ValueError: If a flag is not a recognised boolean.
+    """
+    filters = {}
+    for name, column in AMENITIES.items():
+        value = args.get(name)
+        if value is None:
+            continue
+        value = value.lower()
+        if value in ("1", "true", "yes"):
+            filters[column] = True
+        elif value in ("0", "false", "no"):
+            filters[column] = False
+        else:
+            raise ValueError(f"{name} must be true or false.")
+    return filters
@@ -0,0 +1,195 @@
+import csv
+import io
+import json
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from route_utils.geo import parse_coordinates
+from route_utils.numeric_fields import parse_price, parse_seats
+from route_utils.route_helpers import normalize_location
+
+DEFAULT_BATCH_SIZE = 500
+FORMATS = ("jsonl", "csv")
+
+# Input field -> Cafe column, using the same field names as the /api/add form
+TEXT_FIELDS = {
+    "name": "name",
+    "map_url": "map_url",
+    "img_url": "img_url",
+    "loc": "location",
+    "seats": "seats",
+    "coffee_price": "coffee_price",
+}
+BOOLEAN_FIELDS = {
+    "sockets": "has_sockets",
+    "toilet": "has_toilet",
+    "wifi": "has_wifi",
+    "calls": "can_take_calls",
+}
+REQUIRED_FIELDS = ("name", "map_url", "img_url", "loc", "seats")
+
+
+class BulkImportError(ValueError):
+    """Raised when the uploaded file itself cannot be read."""
+
+
+def iter_records(stream, fmt):
+    """
+    Read cafe records one at a time from a JSON Lines or CSV stream.
+
+    Args:
+        stream: A binary or text file object.
+        fmt: "jsonl" or "csv".
+
+    Yields:
+        (line, record) tuples. `record` is a dict, or an error string if the
+        line could not be parsed.
+    """
+    if fmt not in FORMATS:
+        raise BulkImportError(f"format must be one of: {', '.join(FORMATS)}.")
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(stream)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            yield from _iter_json_lines(stream)
+    except (UnicodeDecodeError, csv.Error):
+        raise BulkImportError("Could not read the uploaded file.")
+
+
+def detect_format(filename=None, mimetype=None):
+    """
+    Guess the input format from an uploaded file name or the request mimetype.
+    JSON Lines is assumed unless the input looks like CSV.
+    """
+    if (filename and filename.lower().endswith(".csv")) or mimetype == "text/csv":
+        return "csv"
+    return "jsonl"
+
+
+def _iter_json_lines(stream):
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError:
+            yield line, "Invalid JSON"
+            continue
+        yield line, record if isinstance(record, dict) else "Expected a JSON object"
+
+
+def parse_boolean(value):
+    """
+    Interpret a boolean field from JSON or CSV input.
+
+    Unlike `bool()`, the strings "0", "false" and "no" count as False, since
+    CSV cells are always strings.
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def validate_record(record):
+    """
+    Turn one input record into the column values of a new cafe.
+
+    Args:
+        record: A dict keyed by the /api/add form field names.
+
+    Returns:
+        A (values, error) tuple. Exactly one of them is None.
+    """
+    missing = [field for field in REQUIRED_FIELDS if record.get(field) in (None, "")]
+    if missing:
+        return None, f"Missing input parameters: {', '.join(missing)}"
+
+    values = {}
+    for field, column in TEXT_FIELDS.items():
+        value = record.get(field)
+        # JSON numbers such as "seats": 20 are taken as their text
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        elif value is not None and not isinstance(value, str):
+            return None, f"{field} must be a string"
+        values[column] = value
+    if values["coffee_price"] == "":
+        values["coffee_price"] = None
+    for field, column in BOOLEAN_FIELDS.items():
+        values[column] = parse_boolean(record.get(field))
+    # Bulk inserts bypass the model validators, so derived columns are set here
+    values["location_key"] = normalize_location(values["location"])
+    values["latitude"], values["longitude"] = parse_coordinates(values["map_url"])
+    values["seats_min"], values["seats_max"] = parse_seats(values["seats"])
+    values["price_minor"], values["price_currency"] = parse_price(values["coffee_price"])
+    return values, None
+
+
+def import_cafes(session, Cafe_Model, records, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Validate and insert cafes in batches inside the session's transaction.
+
+    Rows are validated as they are read and valid rows are inserted with one
+    multi-row INSERT per batch. Names already in the database or repeated in the
+    input are reported as duplicates. The INSERT skips names that another writer
+    added after that check (ON CONFLICT DO NOTHING), and RETURNING shows which
+    rows were skipped, so no row can fail the whole transaction. The caller commits.
+
+    Args:
+        session: The SQLAlchemy session.
+        Cafe_Model: The Cafe model class.
+        records: An iterable of (line, record) tuples from `iter_records`.
+        batch_size: The number of rows per INSERT.
+
+    Returns:
+        An (inserted, errors) tuple, where `errors` lists a dict with the line,
+        name and error message of every rejected row.
+    """
+    inserted = 0
+    errors = []
+    seen_names = set()
+    batch = []
+    stmt = (
+        insert(Cafe_Model)
+        .on_conflict_do_nothing(index_elements=[Cafe_Model.name])
+        .returning(Cafe_Model.name)
+    )
+
+    def flush():
+        nonlocal inserted
+        names = [values["name"] for _, values in batch]
+        existing = set(session.execute(select(Cafe_Model.name).where(Cafe_Model.name.in_(names))).scalars())
+        rows = [values for _, values in batch if values["name"] not in existing]
+        added = set(session.execute(stmt, rows).scalars()) if rows else set()
+        for line, values in batch:
+            if values["name"] in added:
+                inserted += 1
+            else:
+                errors.append({"line": line, "name": values["name"], "error": "Duplicate entry"})
+        batch.clear()
+
+    for line, record in records:
+        if isinstance(record, str):
+            errors.append({"line": line, "name": None, "error": record})
+            continue
+        values, error = validate_record(record)
+        if error is None and values["name"] in seen_names:
+            error = "Duplicate entry"
+        if error is not None:
+            errors.append({"line": line, "name": record.get("name"), "error": error})
+            continue
+        seen_names.add(values["name"])
+        batch.append((line, values))
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    errors.sort(key=lambda error: error["line"])
+    return inserted, errors
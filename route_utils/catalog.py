@@ -0,0 +1,259 @@
+import random
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+
+from route_utils.generation import GenerationGuard
+from route_utils.route_helpers import CAFE_RESPONSE_FIELDS, get_cafe_response, prefix_upper_bound
+
+# Columns kept per cafe: the response fields first, so records can be passed
+# to `row_response`, `many_responses` and `page_response` like database rows,
+# then the id and the derived columns used to search
+RECORD_FIELDS = CAFE_RESPONSE_FIELDS + ("id", "location_key", "seats_min", "seats_max", "price_minor", "price_currency")
+CafeRecord = namedtuple("CafeRecord", RECORD_FIELDS)
+
+
+def catalog_columns(Cafe_Model, response_columns):
+    """
+    Return the columns to select for `CafeRecord`s.
+
+    Args:
+        Cafe_Model: The Cafe model class.
+        response_columns: The columns from `cafe_response_columns`.
+    """
+    return [*response_columns, *(getattr(Cafe_Model, field) for field in RECORD_FIELDS[len(CAFE_RESPONSE_FIELDS):])]
+
+
+def record_from_model(cafe):
+    """Build the `CafeRecord` of a Cafe object, without another query."""
+    return CafeRecord(
+        **get_cafe_response(cafe),
+        **{field: getattr(cafe, field) for field in RECORD_FIELDS[len(CAFE_RESPONSE_FIELDS):]},
+    )
+
+
+def _order_key(record):
+    return record.name, record.id
+
+
+class CatalogSnapshot:
+    """
+    An immutable view of every cafe, indexed for the read routes.
+
+    Writes never modify a snapshot. `apply` returns a new snapshot that shares
+    the unchanged records with the old one, so requests still reading the old
+    snapshot are unaffected.
+    """
+    __slots__ = ("version", "records", "ordered", "by_location", "location_keys")
+
+    def __init__(self, version, records, ordered, by_location, location_keys):
+        self.version = version
+        # id -> CafeRecord
+        self.records = records
+        # Every record, ordered by (name, id) like /api/all
+        self.ordered = ordered
+        # location_key -> records ordered by (name, id)
+        self.by_location = by_location
+        # Sorted location keys, for prefix searches
+        self.location_keys = location_keys
+
+    @classmethod
+    def build(cls, rows, version=0):
+        """Build a snapshot from rows selected with `catalog_columns`."""
+        ordered = sorted((CafeRecord(*row) for row in rows), key=_order_key)
+        by_location = {}
+        for record in ordered:
+            by_location.setdefault(record.location_key, []).append(record)
+        return cls(
+            version,
+            {record.id: record for record in ordered},
+            ordered,
+            by_location,
+            sorted(key for key in by_location if key is not None),
+        )
+
+    def apply(self, upserts=(), discards=()):
+        """
+        Return a snapshot with several changes applied at once.
+
+        The containers are copied once per call rather than once per cafe,
+        and each location list only when one of its cafes changes.
+
+        Args:
+            upserts: Records that are added or replace the cafe with the same id.
+            discards: Ids of cafes to remove. Unknown ids are ignored.
+        """
+        new = {record.id: record for record in upserts}
+        old = [self.records[cafe_id] for cafe_id in {*discards, *new} if cafe_id in self.records]
+        if not new and not old:
+            return self
+
+        records = dict(self.records)
+        ordered = list(self.ordered)
+        by_location = dict(self.by_location)
+        copied = set()
+
+        def location_list(location_key):
+            if location_key not in copied:
+                copied.add(location_key)
+                by_location[location_key] = list(by_location.get(location_key, ()))
+            return by_location[location_key]
+
+        for record in old:
+            del records[record.id]
+            del ordered[bisect_left(ordered, _order_key(record), key=_order_key)]
+            same_location = location_list(record.location_key)
+            del same_location[bisect_left(same_location, _order_key(record), key=_order_key)]
+        for record in new.values():
+            records[record.id] = record
+            insort(ordered, record, key=_order_key)
+            insort(location_list(record.location_key), record, key=_order_key)
+
+        location_keys = self.location_keys
+        for location_key in copied:
+            if not by_location[location_key]:
+                del by_location[location_key]
+        if any((key in by_location) != (key in self.by_location) for key in copied):
+            location_keys = sorted(key for key in by_location if key is not None)
+        return CatalogSnapshot(self.version + 1, records, ordered, by_location, location_keys)
+
+    def page(self, limit, after=None):
+        """Return up to `limit + 1` records following the (name, id) position `after`."""
+        start = bisect_right(self.ordered, tuple(after), key=_order_key) if after else 0
+        return self.ordered[start:start + limit + 1]
+
+    def search(self, loc, match, filters):
+        """
+        Answer /api/search like `search_query` does in SQL.
+
+        Args:
+            loc: The normalized location, or None.
+            match: 'exact' or 'prefix'.
+            filters: The filters returned by `parse_range_filters`.
+
+        Returns:
+            The matching records in the requested order.
+        """
+        if not loc:
+            candidates = self.ordered
+        elif match == "exact":
+            candidates = self.by_location.get(loc, ())
+        else:
+            upper = prefix_upper_bound(loc)
+            keys = self.location_keys[
+                bisect_left(self.location_keys, loc):
+                len(self.location_keys) if upper is None else bisect_left(self.location_keys, upper)
+            ]
+            candidates = sorted((record for key in keys for record in self.by_location[key]), key=_order_key)
+
+        results = [record for record in candidates if _matches(record, filters)]
+        sort = filters["sort"]
+        if sort != "name":
+            field = {"price": "price_minor", "seats": "seats_min"}[sort.lstrip("-")]
+            sign = -1 if sort.startswith("-") else 1
+            # Missing values sort last in both directions, then by name
+            results.sort(key=lambda record: (
+                getattr(record, field) is None, sign * (getattr(record, field) or 0), record.name,
+            ))
+        return results
+
+    def choice(self):
+        """Return a random record, or None if the catalog is empty."""
+        return random.choice(self.ordered) if self.ordered else None
+
+    def __len__(self):
+        return len(self.records)
+
+
+def _matches(record, filters):
+    # A missing value never matches a bound, like NULL comparisons in SQL
+    for name, field, compare in (
+        ("min_seats", "seats_min", lambda value, bound: value >= bound),
+        ("max_seats", "seats_max", lambda value, bound: value <= bound),
+        ("min_price", "price_minor", lambda value, bound: value >= bound),
+        ("max_price", "price_minor", lambda value, bound: value <= bound),
+        ("currency", "price_currency", lambda value, bound: value == bound),
+    ):
+        if name in filters:
+            value = getattr(record, field)
+            if value is None or not compare(value, filters[name]):
+                return False
+    return True
+
+
+class CafeCatalog(GenerationGuard):
+    """
+    An optional in-process copy of the cafe table serving the read routes.
+
+    Readers take the current `CatalogSnapshot` with one attribute read and
+    never lock. The write routes apply their change to a new snapshot and swap
+    it in once they have committed. The catalog is loaded lazily, and a load
+    that raced with a write is used for that request but not installed, see
+    `GenerationGuard`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._snapshot = None
+
+    @property
+    def snapshot(self):
+        """The current snapshot, or None if the catalog is not loaded."""
+        return self._snapshot
+
+    def install(self, rows, generation):
+        """
+        Build a snapshot from `rows` and install it unless a write happened
+        since `generation` was read.
+
+        Returns:
+            The snapshot built from `rows`.
+        """
+        snapshot = CatalogSnapshot.build(rows)
+        with self._installing(generation) as current:
+            if current and self._snapshot is None:
+                self._snapshot = snapshot
+        return snapshot
+
+    def load(self, fetch):
+        """Return the current snapshot, building it from `fetch()` rows if needed."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        generation = self.generation
+        return self.install(fetch(), generation)
+
+    def apply(self, upserts=(), discards=(), updates=None):
+        """
+        Swap in one new snapshot holding every change of a write request.
+
+        Args:
+            upserts: Records to add or replace.
+            discards: Ids of deleted cafes.
+            updates: An optional {cafe_id: {column: value}} dict of columns to
+                change on cafes already in the catalog.
+        """
+        with self._writing():
+            if self._snapshot is None:
+                return
+            upserts = list(upserts)
+            for cafe_id, values in (updates or {}).items():
+                record = self._snapshot.records.get(cafe_id)
+                if record is not None:
+                    upserts.append(record._replace(**values))
+            self._snapshot = self._snapshot.apply(upserts, discards)
+
+    def upsert(self, record):
+        """Add or replace one cafe."""
+        self.apply(upserts=(record,))
+
+    def update(self, cafe_id, **values):
+        """Change some columns of one cafe."""
+        self.apply(updates={cafe_id: values})
+
+    def discard(self, cafe_id):
+        self.apply(discards=(cafe_id,))
+
+    def reset(self):
+        """Drop the snapshot so it is reloaded on next use."""
+        with self._writing():
+            self._snapshot = None
@@ -0,0 +1,113 @@
+from sqlalchemy import Column, Integer, MetaData, String, Table, func, select
+
+from route_utils.numeric_fields import SQLITE_MAX_INTEGER
+
+CHANGE_TABLE = "cafe_change"
+
+_CREATE_CHANGE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {CHANGE_TABLE} (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    cafe_id INTEGER NOT NULL,
+    op VARCHAR(6) NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# Log every write to `cafe`, whichever route or process made it. AUTOINCREMENT
+# keeps sequence numbers increasing even after rows are deleted.
+_CREATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cafe_change_{op} AFTER {op.upper()} ON cafe BEGIN
+        INSERT INTO {CHANGE_TABLE} (cafe_id, op) VALUES ({row}.id, '{op}');
+    END
+    """
+    for op, row in (("insert", "new"), ("update", "new"), ("delete", "old"))
+]
+
+cafe_change = Table(
+    CHANGE_TABLE,
+    MetaData(),
+    Column("seq", Integer, primary_key=True),
+    Column("cafe_id", Integer),
+    Column("op", String(6)),
+)
+
+
+def create_change_log(connection):
+    """
+    Create the change log table and its triggers.
+
+    When the table is new, every existing cafe is logged as an insert, so a
+    consumer syncing from sequence 0 receives the whole dataset.
+
+    Args:
+        connection: An open SQLAlchemy connection.
+    """
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CHANGE_TABLE,)
+    ).first()
+    connection.exec_driver_sql(_CREATE_CHANGE_TABLE)
+    if not exists:
+        connection.exec_driver_sql(f"INSERT INTO {CHANGE_TABLE} (cafe_id, op) SELECT id, 'insert' FROM cafe ORDER BY id")
+    for trigger in _CREATE_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+
+
+def changes_since(since, limit):
+    """
+    Build the query for the cafes changed after sequence `since`.
+
+    Several changes to one cafe collapse into its latest one, so a page lists
+    each cafe once, ordered by the sequence number of its last change.
+
+    Args:
+        since: The last sequence number the consumer has applied.
+        limit: The maximum number of cafes to return.
+
+    Returns:
+        A select of (cafe_id, seq) rows.
+    """
+    seq = func.max(cafe_change.c.seq).label("seq")
+    return (
+        select(cafe_change.c.cafe_id, seq)
+        .where(cafe_change.c.seq > since)
+        .group_by(cafe_change.c.cafe_id)
+        .order_by(seq)
+        .limit(limit)
+    )
+
+
+def latest_change():
+    """Build the query for the last sequence number, 0 when nothing was logged."""
+    return select(func.coalesce(func.max(cafe_change.c.seq), 0))
+
+
+def changes_after(since, limit):
+    """
+    Build the query for the individual changes after sequence `since`.
+
+    Unlike `changes_since`, every change is listed, oldest first, with its
+    operation ('insert', 'update' or 'delete').
+
+    Returns:
+        A select of (seq, cafe_id, op) rows.
+    """
+    return (
+        select(cafe_change.c.seq, cafe_change.c.cafe_id, cafe_change.c.op)
+        .where(cafe_change.c.seq > since)
+        .order_by(cafe_change.c.seq)
+        .limit(limit)
+    )
+
+
+def parse_since(args):
+    """
+    Read the `since` query parameter.
+
+    Raises:
+        ValueError: If it is not a non-negative integer that fits a sequence number.
+    """
+    since = args.get("since", "0")
+    if not since.isdigit() or int(since) > SQLITE_MAX_INTEGER:
+        raise ValueError("since must be a non-negative integer.")
+    return int(since)
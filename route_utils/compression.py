@@ -0,0 +1,94 @@
+import gzip
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip alone is offered without it
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed, the saving would not pay for the work
+DEFAULT_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = frozenset({"application/json", "text/html", "text/plain", "text/csv"})
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def supported_encodings():
+    """Return the content codings this process can produce, most preferred first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding):
+    """
+    Pick the content coding to send for an Accept-Encoding header.
+
+    Args:
+        accept_encoding: The raw header value, or None when it was not sent.
+
+    Returns:
+        "br", "gzip", or None to send the body as it is.
+    """
+    if not accept_encoding:
+        return None
+    return parse_accept_header(accept_encoding).best_match(supported_encodings())
+
+
+def compress(body, encoding):
+    """Compress `body` with the content coding returned by `negotiate`."""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # A fixed mtime keeps the output, and so its ETag, the same for the same body
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(mimetype, size, min_size):
+    """
+    Tell whether a body of `size` bytes may be sent compressed.
+
+    Args:
+        mimetype: The response mimetype.
+        size: The length of the uncompressed body.
+        min_size: The configured threshold, or None when compression is disabled.
+    """
+    return min_size is not None and size >= min_size and mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def compress_response(response, accept_encoding, min_size):
+    """
+    Compress a Flask response in place when the client accepts it.
+
+    Streamed responses and responses that already carry a Content-Encoding,
+    such as those served from the response cache, are left unchanged.
+
+    Args:
+        response: The response returned by the view.
+        accept_encoding: The request's Accept-Encoding header.
+        min_size: The threshold passed to `is_compressible`.
+
+    Returns:
+        The same response.
+    """
+    if (
+        response.is_streamed
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+    ):
+        return response
+    body = response.get_data()
+    if not is_compressible(response.mimetype, len(body), min_size):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return response
+    response.set_data(compress(body, encoding))
+    response.content_encoding = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        # Each representation needs its own strong validator
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
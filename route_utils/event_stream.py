@@ -0,0 +1,204 @@
+import json
+import logging
+import queue
+import threading
+
+from flask import Response
+
+logger = logging.getLogger("cafe_api.event_stream")
+
+# Events buffered per subscriber before it is considered too slow and dropped.
+# Also the most missed events replayed to a client reconnecting with Last-Event-ID.
+DEFAULT_QUEUE_SIZE = 256
+# Concurrent /api/stream connections per process; each one holds a worker thread,
+# so serve.py lowers this below its thread count
+DEFAULT_MAX_SUBSCRIBERS = 64
+# Seconds between two reads of the change log while streams are open
+DEFAULT_POLL_INTERVAL = 0.5
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE_INTERVAL = 15
+
+
+class SubscriberLimitReached(Exception):
+    """Raised when every subscriber slot is taken."""
+
+
+def encode_event(seq, event, data):
+    """Encode one change as an SSE message whose id is its change log sequence number."""
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class Subscription:
+    """The bounded queue of encoded events waiting to be sent to one client."""
+
+    def __init__(self, queue_size):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = False
+        # Missed events to send before the live ones, when resuming from Last-Event-ID
+        self.backlog = []
+        # Set when more events were missed than can be replayed
+        self.resync_since = None
+
+    def get(self, timeout):
+        """Return the next encoded event, or None if none arrived within `timeout` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """
+    Fans the changes recorded in the cafe_change log out to the /api/stream
+    subscribers of this process.
+
+    While at least one stream is open, a background thread reads the log
+    every `poll_interval` seconds, or as soon as `notify` is called after a
+    local write. The log is shared by every process, so subscribers see the
+    writes of all workers, and each event carries its sequence number as
+    its SSE id.
+
+    Each event is encoded once and offered to every subscriber queue without
+    blocking. A subscriber whose queue is full has fallen behind: it is dropped
+    and its stream ends, so a slow client can never hold up the others.
+    Dropped clients reconnect with Last-Event-ID, or catch up through
+    /api/changes when they missed too much.
+    """
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, max_subscribers=DEFAULT_MAX_SUBSCRIBERS,
+                 poll_interval=DEFAULT_POLL_INTERVAL):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.poll_interval = poll_interval
+        self._subscribers = set()
+        self._source = None
+        self._poller = None
+        # Sequence number of the last change handed to the subscribers
+        self._last_seq = 0
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def subscribe(self, source, last_event_id=None):
+        """
+        Register a new subscriber.
+
+        Args:
+            source: The change log reader, with `latest()` returning the last
+                sequence number and `read(since, limit)` returning the
+                (seq, event, data) tuples of the changes after `since`.
+            last_event_id: The last sequence number the client received, to
+                replay the events it missed.
+
+        Raises:
+            SubscriberLimitReached: If `max_subscribers` streams are already open.
+        """
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise SubscriberLimitReached
+            if self._poller is None:
+                # Streams only receive changes made from now on
+                self._source = source
+                self._last_seq = source.latest()
+                self._poller = threading.Thread(target=self._poll, name="cafe-event-poller", daemon=True)
+                self._poller.start()
+            self._subscribers.add(subscription)
+            live_from = self._last_seq
+
+        if last_event_id is not None and last_event_id < live_from:
+            # Changes up to `live_from` will not reach the queue, replay them
+            missed = [change for change in source.read(last_event_id, self.queue_size + 1) if change[0] <= live_from]
+            if len(missed) > self.queue_size:
+                subscription.resync_since = last_event_id
+            else:
+                subscription.backlog = [encode_event(*change) for change in missed]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def notify(self):
+        """Read the change log now instead of at the next poll, after a local write."""
+        self._wake.set()
+
+    def _poll(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self._lock:
+                if not self._subscribers:
+                    self._poller = None
+                    return
+                source, since = self._source, self._last_seq
+            try:
+                changes = source.read(since, self.queue_size)
+            except Exception:  # keep streaming once the database is reachable again
+                logger.exception("Could not read the change log")
+                continue
+            self._publish(changes)
+            if len(changes) == self.queue_size:
+                # More changes are waiting
+                self._wake.set()
+
+    def _publish(self, changes):
+        with self._lock:
+            for change in changes:
+                self._last_seq = change[0]
+                message = encode_event(*change)
+                for subscription in list(self._subscribers):
+                    try:
+                        subscription.queue.put_nowait(message)
+                    except queue.Full:
+                        subscription.dropped = True
+                        self._subscribers.discard(subscription)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+def parse_last_event_id(value):
+    """
+    Read a Last-Event-ID header or `since` parameter.
+
+    Returns:
+        The sequence number, or None if `value` is None or empty.
+
+    Raises:
+        ValueError: If it is not a non-negative integer.
+    """
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValueError("Last-Event-ID must be a non-negative integer.")
+    return int(value)
+
+
+def stream_response(broker, subscription, keepalive=KEEPALIVE_INTERVAL):
+    """
+    Stream the events of `subscription` as text/event-stream.
+
+    A client that missed more events than can be replayed receives one
+    'resync' event with the `since` value to pass to /api/changes, and the
+    stream ends. The subscription is released when the client disconnects or
+    is dropped for falling behind.
+    """
+    def generate():
+        try:
+            yield b"retry: 3000\n\n"
+            if subscription.resync_since is not None:
+                yield f"event: resync\ndata: {json.dumps({'since': subscription.resync_since})}\n\n".encode()
+                return
+            yield from subscription.backlog
+            subscription.backlog = []
+            while not subscription.dropped:
+                message = subscription.get(keepalive)
+                yield message if message is not None else b": keep-alive\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop reverse proxies such as nginx from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
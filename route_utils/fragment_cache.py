@@ -0,0 +1,62 @@
+from route_utils.generation import GenerationGuard
+from route_utils.route_helpers import row_response
+
+# Cafes whose encoded JSON is kept; the oldest entries are dropped first
+DEFAULT_MAX_FRAGMENTS = 100_000
+
+
+class CafeFragmentCache(GenerationGuard):
+    """
+    The encoded JSON of each cafe response, keyed by cafe id.
+
+    List responses are assembled by joining the cached fragments of their rows,
+    so a cafe is encoded once after each change instead of once per response.
+    The write routes call `invalidate` for the cafes they change.
+
+    Fragments encoded from rows that raced with a write are used for that
+    response but not stored, see `GenerationGuard`.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_FRAGMENTS):
+        super().__init__()
+        self.max_entries = max_entries
+        self._fragments = {}
+
+    def join(self, rows, encode):
+        """
+        Return the comma-joined JSON of `rows`, in order.
+
+        Args:
+            rows: Rows selected with `cafe_response_columns` plus the cafe id,
+                or catalog records.
+            encode: A function serializing one response dict to JSON bytes.
+        """
+        rows = list(rows)
+        with self._lock:
+            generation = self.generation
+            parts = [self._fragments.get(row.id) for row in rows]
+
+        encoded = {}
+        for position, row in enumerate(rows):
+            if parts[position] is None:
+                parts[position] = encoded[row.id] = encode(row_response(row))
+
+        if encoded:
+            with self._installing(generation) as current:
+                if current and self.max_entries > 0:
+                    self._fragments.update(encoded)
+                    while len(self._fragments) > self.max_entries:
+                        del self._fragments[next(iter(self._fragments))]
+        return b",".join(parts)
+
+    def invalidate(self, cafe_id):
+        """Drop the fragment of a changed or deleted cafe."""
+        with self._writing():
+            self._fragments.pop(cafe_id, None)
+
+    def clear(self):
+        with self._writing():
+            self._fragments.clear()
+
+    def __len__(self):
+        return len(self._fragments)
@@ -0,0 +1,94 @@
+import re
+
+from sqlalchemy import column, literal_column, table, text
+from sqlalchemy.exc import OperationalError
+
+FTS_TABLE = "cafe_fts"
+
+# External-content FTS5 table: the text lives in `cafe`, only the index is stored here
+_CREATE_FTS = f"""
+CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+    name, location,
+    content='cafe', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+)
+"""
+
+# Triggers keep the index in sync with every write to `cafe`, whichever route makes it
+_CREATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cafe_fts_insert AFTER INSERT ON cafe BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, location) VALUES (new.id, new.name, new.location);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cafe_fts_delete AFTER DELETE ON cafe BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, location) VALUES ('delete', old.id, old.name, old.location);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cafe_fts_update AFTER UPDATE OF name, location ON cafe BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, location) VALUES ('delete', old.id, old.name, old.location);
+        INSERT INTO {FTS_TABLE}(rowid, name, location) VALUES (new.id, new.name, new.location);
+    END
+    """,
+]
+
+cafe_fts = table(FTS_TABLE, column("rowid"), column("rank"))
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def create_fulltext_index(connection):
+    """
+    Create the FTS5 index over cafe names and locations with its sync triggers.
+
+    The index is rebuilt from the `cafe` table the first time it is created.
+
+    Args:
+        connection: An open SQLAlchemy connection.
+
+    Returns:
+        True if full-text search is available, False if SQLite was built without FTS5.
+    """
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE},
+    ).first()
+    if exists is None:
+        try:
+            connection.exec_driver_sql(_CREATE_FTS)
+        except OperationalError:
+            return False
+        connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    for trigger in _CREATE_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+    return True
+
+
+def build_match_query(query):
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+
+    Every word is quoted so FTS5 operators in user input are treated as text,
+    and the last word is matched as a prefix so partial names find results.
+
+    Args:
+        query: The raw search text.
+
+    Returns:
+        The MATCH expression, or None if the text contains no words.
+    """
+    tokens = _TOKEN.findall(query or "")
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def fulltext_condition(match_query):
+    """Return the WHERE clause matching `match_query` against the FTS index."""
+    return literal_column(FTS_TABLE).op("MATCH")(match_query)
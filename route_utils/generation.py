@@ -0,0 +1,41 @@
+import threading
+from contextlib import contextmanager
+
+
+class GenerationGuard:
+    """
+    Base class of the in-memory structures that are loaded lazily from the
+    database and then kept up to date by the write routes.
+
+    A load queries the database outside of any lock, so a write can commit
+    between the query and the moment its result is installed. Every write
+    therefore bumps a generation counter, and the rows of a load are only
+    installed if the counter still holds the value read before the query.
+    Otherwise they may be stale: callers read them again, or use them for the
+    current response only.
+
+    Subclasses wrap their writes in `_writing()` and their installs in
+    `_installing(generation)`, and take `_lock` directly for plain reads.
+    """
+
+    def __init__(self):
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        """The write counter, to read before querying rows to install."""
+        return self._generation
+
+    @contextmanager
+    def _writing(self):
+        """Hold the lock for a write and mark every load started before it as stale."""
+        with self._lock:
+            self._generation += 1
+            yield
+
+    @contextmanager
+    def _installing(self, generation):
+        """Hold the lock and yield whether rows read at `generation` are still current."""
+        with self._lock:
+            yield generation == self._generation
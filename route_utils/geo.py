@@ -0,0 +1,206 @@
+import math
+import re
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from sqlalchemy import and_, column, or_, table, text
+
+EARTH_RADIUS_KM = 6371.0088
+# Half the Earth's circumference: no two points are further apart than this
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+
+RTREE_TABLE = "cafe_rtree"
+
+# Each cafe is stored as a zero-area box, so the R*Tree answers bounding-box queries
+_CREATE_RTREE = f"""
+CREATE VIRTUAL TABLE {RTREE_TABLE} USING rtree(id, min_lat, max_lat, min_lng, max_lng)
+"""
+
+_RTREE_ROW = "SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude " \
+             "WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL"
+
+# Triggers keep the spatial index in sync with every write to `cafe`
+_CREATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cafe_rtree_insert AFTER INSERT ON cafe BEGIN
+        INSERT INTO {RTREE_TABLE} {_RTREE_ROW};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cafe_rtree_delete AFTER DELETE ON cafe BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cafe_rtree_update AFTER UPDATE OF latitude, longitude ON cafe BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = old.id;
+        INSERT INTO {RTREE_TABLE} {_RTREE_ROW};
+    END
+    """,
+]
+
+cafe_rtree = table(RTREE_TABLE, column("id"), column("min_lat"), column("max_lat"), column("min_lng"), column("max_lng"))
+
+_NUMBER = r"(-?\d{1,3}(?:\.\d+)?)"
+# Most precise first: the place marker (!3d..!4d..), then the map centre (@lat,lng)
+_URL_PATTERNS = [
+    re.compile(rf"!3d{_NUMBER}!4d{_NUMBER}"),
+    re.compile(rf"@{_NUMBER},{_NUMBER}"),
+]
+_QUERY_PATTERN = re.compile(rf"^\s*{_NUMBER}\s*,\s*{_NUMBER}\s*$")
+_QUERY_KEYS = ("q", "query", "ll", "center", "destination")
+
+
+def parse_coordinates(map_url):
+    """
+    Extract the latitude and longitude of a cafe from its map URL.
+
+    Understands Google Maps place URLs (".../@51.52,-0.08,17z/...!3d51.52!4d-0.08")
+    and coordinate query parameters such as "?q=51.52,-0.08".
+
+    Args:
+        map_url: The map URL, or None.
+
+    Returns:
+        A (latitude, longitude) tuple, or (None, None) if the URL has no valid coordinates.
+    """
+    if not map_url:
+        return None, None
+
+    url = unquote(map_url)
+    for pattern in _URL_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return _valid(match.group(1), match.group(2))
+
+    query = parse_qs(urlsplit(url).query)
+    for key in _QUERY_KEYS:
+        for value in query.get(key, ()):
+            match = _QUERY_PATTERN.match(value)
+            if match:
+                return _valid(match.group(1), match.group(2))
+    return None, None
+
+
+def _valid(latitude, longitude):
+    latitude, longitude = float(latitude), float(longitude)
+    if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+        return latitude, longitude
+    return None, None
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points, in kilometres."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_boxes(latitude, longitude, radius_km):
+    """
+    Compute the latitude/longitude boxes covering a circle.
+
+    A circle crossing the antimeridian is split in two boxes, and one reaching
+    a pole covers every longitude.
+
+    Returns:
+        A list of (min_lat, max_lat, min_lng, max_lng) tuples.
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = latitude - delta_lat, latitude + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return [(max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0)]
+
+    delta_lng = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude)))))
+    min_lng, max_lng = longitude - delta_lng, longitude + delta_lng
+    if min_lng < -180:
+        return [(min_lat, max_lat, min_lng + 360, 180.0), (min_lat, max_lat, -180.0, max_lng)]
+    if max_lng > 180:
+        return [(min_lat, max_lat, min_lng, 180.0), (min_lat, max_lat, -180.0, max_lng - 360)]
+    return [(min_lat, max_lat, min_lng, max_lng)]
+
+
+def create_spatial_index(connection):
+    """
+    Create the R*Tree index over cafe coordinates with its sync triggers.
+
+    The index is filled from the `cafe` table the first time it is created.
+
+    Args:
+        connection: An open SQLAlchemy connection.
+
+    Returns:
+        True if the R*Tree index is available, False if SQLite was built without it.
+    """
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": RTREE_TABLE},
+    ).first()
+    if exists is None:
+        try:
+            connection.exec_driver_sql(_CREATE_RTREE)
+        except Exception:
+            return False
+        connection.exec_driver_sql(
+            f"INSERT INTO {RTREE_TABLE} SELECT id, latitude, latitude, longitude, longitude "
+            f"FROM cafe WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )
+
+    for trigger in _CREATE_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+    return True
+
+
+def box_condition(boxes, use_rtree, latitude_column, longitude_column):
+    """
+    Build the WHERE clause selecting cafes inside any of `boxes`.
+
+    With the R*Tree the boxes are matched against `cafe_rtree`. Without it, the
+    indexed latitude/longitude columns of `cafe` are used instead.
+    """
+    if use_rtree:
+        lat_min, lat_max = cafe_rtree.c.min_lat, cafe_rtree.c.max_lat
+        lng_min, lng_max = cafe_rtree.c.min_lng, cafe_rtree.c.max_lng
+    else:
+        lat_min = lat_max = latitude_column
+        lng_min = lng_max = longitude_column
+    # A cafe's box overlaps the search box when neither lies entirely beside the other
+    return or_(*[
+        and_(lat_max >= min_lat, lat_min <= max_lat, lng_max >= min_lng, lng_min <= max_lng)
+        for min_lat, max_lat, min_lng, max_lng in boxes
+    ])
+
+
+def nearest(fetch, latitude, longitude, radius_km=None, k=None, start_radius_km=1.0):
+    """
+    Find cafes within `radius_km`, or the `k` nearest ones, ordered by distance.
+
+    Only cafes inside the bounding boxes of the search circle are fetched. For a
+    k-nearest query without a radius, the circle starts small and grows until it
+    holds at least `k` cafes, so only the neighbourhood of the point is read.
+
+    Args:
+        fetch: A function taking a list of bounding boxes and returning rows
+            with `latitude` and `longitude` attributes.
+        latitude: The latitude of the search point.
+        longitude: The longitude of the search point.
+        radius_km: The search radius, or None for an unbounded k-nearest search.
+        k: The maximum number of cafes to return, or None for all within the radius.
+        start_radius_km: The first radius tried by an unbounded k-nearest search.
+
+    Returns:
+        A list of (distance_km, row) tuples, nearest first.
+    """
+    radius = radius_km if radius_km is not None else start_radius_km
+    while True:
+        radius = min(radius, MAX_DISTANCE_KM)
+        found = []
+        for row in fetch(bounding_boxes(latitude, longitude, radius)):
+            distance = haversine_km(latitude, longitude, row.latitude, row.longitude)
+            if distance <= radius:
+                found.append((distance, row))
+        if radius_km is not None or len(found) >= k or radius >= MAX_DISTANCE_KM:
+            break
+        radius *= 4
+
+    found.sort(key=lambda item: item[0])
+    return found[:k] if k is not None else found
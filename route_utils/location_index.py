@@ -0,0 +1,142 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from route_utils.generation import GenerationGuard
+
+# Locations kept in memory; the least recently searched ones are dropped first
+DEFAULT_MAX_LOCATIONS = 1024
+
+
+class _Location:
+    """The cafes of one location, sorted by name, with their serialized JSON."""
+    __slots__ = ("names", "cafes", "fragments", "body")
+
+    def __init__(self):
+        # (name, id) pairs in /api/search order
+        self.names = []
+        # id -> response dict and id -> its serialized JSON
+        self.cafes = {}
+        self.fragments = {}
+        # The comma-joined fragments in name order, ready to send
+        self.body = b""
+
+    def join(self):
+        self.body = b",".join(self.fragments[cafe_id] for _, cafe_id in self.names)
+
+
+class LocationFragmentIndex(GenerationGuard):
+    """
+    Pre-serialized /api/search results per normalized location.
+
+    Each location keeps its cafe ids sorted by name and the JSON of every cafe,
+    joined into one fragment. An exact location search is then a dict lookup
+    plus wrapping the fragment in `{"cafes":[...]}`. Locations are loaded
+    lazily on their first search and the least recently used ones are dropped
+    beyond `max_locations`. The write routes update loaded locations in place,
+    re-serializing only the cafe that changed.
+
+    A load that raced with a write is returned for that request but not kept,
+    see `GenerationGuard`.
+    """
+
+    def __init__(self, max_locations=DEFAULT_MAX_LOCATIONS):
+        super().__init__()
+        self.max_locations = max_locations
+        self._locations = OrderedDict()
+
+    def get(self, location_key):
+        """Return the joined fragment of a loaded location, or None if it is not loaded."""
+        with self._lock:
+            location = self._locations.get(location_key)
+            if location is None:
+                return None
+            self._locations.move_to_end(location_key)
+            return location.body
+
+    def install(self, location_key, cafes, encode, generation):
+        """
+        Serialize and keep the cafes of a location.
+
+        Args:
+            location_key: The normalized location.
+            cafes: The response dicts of every cafe in the location.
+            encode: A function serializing one response dict to JSON bytes.
+            generation: The `generation` read before querying `cafes`.
+
+        Returns:
+            The joined fragment.
+        """
+        location = _Location()
+        for cafe_id, cafe in cafes:
+            location.cafes[cafe_id] = cafe
+            location.fragments[cafe_id] = encode(cafe)
+            location.names.append((cafe["name"], cafe_id))
+        location.names.sort()
+        location.join()
+        with self._installing(generation) as current:
+            if current and self.max_locations > 0:
+                self._locations[location_key] = location
+                while len(self._locations) > self.max_locations:
+                    self._locations.popitem(last=False)
+        return location.body
+
+    def upsert(self, cafe_id, location_key, cafe, encode):
+        """Add a cafe, or replace it in its location, if the location is loaded."""
+        with self._writing():
+            location = self._locations.get(location_key)
+            if location is None:
+                return
+            self._remove(location, cafe_id)
+            location.cafes[cafe_id] = cafe
+            location.fragments[cafe_id] = encode(cafe)
+            insort(location.names, (cafe["name"], cafe_id))
+            location.join()
+
+    def update(self, cafe_id, location_key, changes, encode):
+        """Change some fields of a cafe that stays in the same location."""
+        with self._writing():
+            location = self._locations.get(location_key)
+            if location is None or cafe_id not in location.cafes:
+                return
+            cafe = location.cafes[cafe_id] = {**location.cafes[cafe_id], **changes}
+            location.fragments[cafe_id] = encode(cafe)
+            location.join()
+
+    def discard(self, cafe_id, location_key):
+        """Remove a deleted cafe from its location."""
+        with self._writing():
+            location = self._locations.get(location_key)
+            if location is not None and self._remove(location, cafe_id):
+                location.join()
+
+    def forget(self, cafe_id):
+        """
+        Remove a cafe from whichever loaded location holds it, for changes
+        whose previous location is not known.
+
+        Returns:
+            The location the cafe was removed from, or None if none was loaded.
+        """
+        with self._writing():
+            for location_key, location in self._locations.items():
+                if self._remove(location, cafe_id):
+                    location.join()
+                    return location_key
+        return None
+
+    def reset(self):
+        """Drop every location so they are reloaded on next use."""
+        with self._writing():
+            self._locations.clear()
+
+    def __len__(self):
+        return len(self._locations)
+
+    @staticmethod
+    def _remove(location, cafe_id):
+        cafe = location.cafes.pop(cafe_id, None)
+        if cafe is None:
+            return False
+        del location.fragments[cafe_id]
+        del location.names[bisect_left(location.names, (cafe["name"], cafe_id))]
+        return True
@@ -0,0 +1,160 @@
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# Upper bounds of the histogram buckets, Prometheus style
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+# [query count, query seconds] of the request being handled in this context
+_request_queries = ContextVar("cafe_request_queries", default=None)
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label set."""
+
+    def __init__(self, name, documentation, buckets, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.label_names = label_names
+        # labels -> [count per bucket..., count, sum]
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[position] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + "," if label_text else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-2]}')
+            lines.append(f"{self.name}_count{{{label_text}}} {series[-2]}")
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]}")
+        return lines
+
+
+class RequestMetrics:
+    """
+    Request latency, response size and per-request database usage, rendered
+    in the Prometheus text format.
+
+    Values are kept per process. When several workers serve the API, each one
+    reports its own series, so scrape them individually or aggregate upstream.
+    """
+
+    def __init__(self):
+        self.latency = Histogram(
+            "cafe_http_request_duration_seconds", "Time spent handling a request.",
+            LATENCY_BUCKETS, ("route", "method", "status"),
+        )
+        self.response_size = Histogram(
+            "cafe_http_response_size_bytes", "Size of the response body.", SIZE_BUCKETS, ("route",),
+        )
+        self.query_count = Histogram(
+            "cafe_db_queries_per_request", "Database queries executed per request.",
+            QUERY_COUNT_BUCKETS, ("route",),
+        )
+        self.query_time = Histogram(
+            "cafe_db_query_duration_seconds", "Time spent in database queries per request.",
+            LATENCY_BUCKETS, ("route",),
+        )
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start measuring a request in the current context.
+
+        Returns:
+            A token to pass to `finish`.
+        """
+        return time.perf_counter(), _request_queries.set([0, 0.0])
+
+    def finish(self, token, route, method, status, size):
+        """
+        Record a request started with `start`.
+
+        Args:
+            token: The value returned by `start`.
+            route: The route pattern, e.g. "/api/update-price/<int:cafe_id>".
+            method: The HTTP method.
+            status: The response status code.
+            size: The response body size in bytes, or None for streamed bodies.
+        """
+        started, queries_token = token
+        elapsed = time.perf_counter() - started
+        query_count, query_seconds = _request_queries.get()
+        _request_queries.reset(queries_token)
+        with self._lock:
+            self.latency.observe((route, method, str(status)), elapsed)
+            if size is not None:
+                self.response_size.observe((route,), size)
+            self.query_count.observe((route,), query_count)
+            self.query_time.observe((route,), query_seconds)
+
+    def render(self, cache_stats=None, gauges=None):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Args:
+            cache_stats: A {endpoint: (hits, misses)} mapping from the response cache.
+            gauges: A {name: (documentation, value)} mapping of point-in-time values.
+        """
+        with self._lock:
+            lines = []
+            for histogram in (self.latency, self.response_size, self.query_count, self.query_time):
+                lines.extend(histogram.render())
+        if cache_stats is not None:
+            lines.append("# HELP cafe_response_cache_lookups_total Response cache lookups by result.")
+            lines.append("# TYPE cafe_response_cache_lookups_total counter")
+            for endpoint, (hits, misses) in sorted(cache_stats.items()):
+                lines.append(f'cafe_response_cache_lookups_total{{endpoint="{_escape(endpoint)}",result="hit"}} {hits}')
+                lines.append(f'cafe_response_cache_lookups_total{{endpoint="{_escape(endpoint)}",result="miss"}} {misses}')
+        for name, (documentation, value) in (gauges or {}).items():
+            lines.extend((f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {value}"))
+        return "\n".join(lines) + "\n"
+
+
+def install_query_events(engine):
+    """
+    Count the queries of `engine` and their duration against the request
+    being measured in the current context, if any.
+
+    Args:
+        engine: A synchronous SQLAlchemy engine (use `.sync_engine` for async ones).
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        queries = _request_queries.get()
+        if queries is not None:
+            queries[0] += 1
+            queries[1] += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _failed_query(exception_context):
+        # after_cursor_execute is skipped when a query fails
+        started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
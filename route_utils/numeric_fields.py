@@ -0,0 +1,150 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+# Currency symbols found in coffee_price strings, mapped to ISO 4217 codes
+CURRENCY_SYMBOLS = {
+    "£": "GBP",
+    "$": "USD",
+    "€": "EUR",
+    "¥": "JPY",
+    "₹": "INR",
+}
+_CURRENCY_CODE = re.compile(r"\b([A-Z]{3})\b")
+_AMOUNT = re.compile(r"\d+(?:[.,]\d+)*")
+_SEATS_RANGE = re.compile(r"^\s*(\d+)\s*(?:-\s*(\d+)|(\+))?\s*$")
+# Largest value SQLite can bind as an INTEGER parameter
+SQLITE_MAX_INTEGER = 2**63 - 1
+
+
+def parse_seats(seats):
+    """
+    Parse a seats string into its minimum and maximum.
+
+    "20-30" gives (20, 30), "50+" gives (50, None) and "10" gives (10, 10).
+
+    Args:
+        seats: The seats string, or None.
+
+    Returns:
+        A (seats_min, seats_max) tuple, or (None, None) if it cannot be parsed.
+    """
+    match = _SEATS_RANGE.match(seats or "")
+    if not match:
+        return None, None
+    low = int(match.group(1))
+    if match.group(3):
+        return low, None
+    high = int(match.group(2)) if match.group(2) else low
+    return min(low, high), max(low, high)
+
+
+def parse_price(coffee_price):
+    """
+    Parse a price string into minor units and a currency code.
+
+    "£2.40" gives (240, "GBP"), "3.5" gives (350, None) and "£1,200" gives
+    (120000, "GBP"). See `normalize_amount` for the separators understood.
+
+    Args:
+        coffee_price: The price string, or None.
+
+    Returns:
+        A (price_minor, price_currency) tuple, or (None, None) if no amount is found.
+    """
+    if not coffee_price:
+        return None, None
+    amount = _AMOUNT.search(coffee_price)
+    if amount is None:
+        return None, None
+    currency = next((code for symbol, code in CURRENCY_SYMBOLS.items() if symbol in coffee_price), None)
+    if currency is None:
+        code = _CURRENCY_CODE.search(coffee_price)
+        currency = code.group(1) if code else None
+    return to_minor_units(normalize_amount(amount.group())), currency
+
+
+def normalize_amount(text):
+    """
+    Turn an amount written with thousands and decimal separators into a
+    plain decimal string.
+
+    The last separator is the decimal point when both "," and "." appear
+    ("1.200,50", "1,200.50"), or when it is the only one and is not followed
+    by exactly three digits ("2,50"). Otherwise the separators group
+    thousands ("1,200", "1.000.000").
+    """
+    separators = [char for char in text if char in ".,"]
+    if not separators:
+        return text
+    last = separators[-1]
+    digits_after = len(text) - text.rfind(last) - 1
+    if len(set(separators)) == 2 or (len(separators) == 1 and digits_after != 3):
+        integer, _, fraction = text.rpartition(last)
+        return integer.replace(",", "").replace(".", "") + "." + fraction
+    return text.replace(",", "").replace(".", "")
+
+
+def to_minor_units(amount):
+    """
+    Convert a decimal amount such as "2.40" to minor units (240).
+
+    Raises:
+        ValueError: If `amount` is not a number.
+    """
+    try:
+        return int((Decimal(amount) * 100).to_integral_value())
+    except (InvalidOperation, OverflowError, TypeError):
+        raise ValueError(f"{amount!r} is not a valid amount.")
+
+
+SORT_OPTIONS = ("name", "price", "-price", "seats", "-seats")
+
+
+def parse_range_filters(args):
+    """
+    Read the seat and price range filters and the sort order of a search.
+
+    Parameters read from `args`:
+    - min_seats, max_seats (int): Cafes whose seating range lies within these bounds.
+    - min_price, max_price (decimal): Price bounds in major units, e.g. 2.50.
+    - currency (str): ISO 4217 code the price bounds are expressed in. Required
+      with a price bound or price sort, since amounts in different currencies
+      cannot be compared.
+    - sort (str): One of `SORT_OPTIONS`; a leading "-" sorts descending.
+
+    Returns:
+        A dict of the given filters, with prices converted to minor units, and
+        the sort order under "sort".
+
+    Raises:
+        ValueError: If a parameter is invalid.
+    """
+    filters = {}
+    for name in ("min_seats", "max_seats"):
+        value = args.get(name)
+        if value is not None:
+            if not value.isdigit() or int(value) > SQLITE_MAX_INTEGER:
+                raise ValueError(f"{name} must be a non-negative integer.")
+            filters[name] = int(value)
+    for name in ("min_price", "max_price"):
+        value = args.get(name)
+        if value is not None:
+            try:
+                filters[name] = to_minor_units(value)
+            except ValueError:
+                raise ValueError(f"{name} must be a number.")
+            if abs(filters[name]) > SQLITE_MAX_INTEGER:
+                raise ValueError(f"{name} must be a number.")
+    currency = args.get("currency")
+    if currency is not None:
+        if not re.fullmatch(r"[A-Za-z]{3}", currency):
+            raise ValueError("currency must be a three-letter ISO 4217 code.")
+        filters["currency"] = currency.upper()
+
+    sort = args.get("sort", "name")
+    if sort not in SORT_OPTIONS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_OPTIONS)}.")
+    filters["sort"] = sort
+    if ("min_price" in filters or "max_price" in filters or sort.endswith("price")) and "currency" not in filters:
+        raise ValueError("currency is required with min_price, max_price or sort=price.")
+    return filters
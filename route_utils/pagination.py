@@ -0,0 +1,141 @@
+import base64
+import json
+
+from flask import Response, current_app, jsonify, stream_with_context
+
+from route_utils.numeric_fields import SQLITE_MAX_INTEGER
+from route_utils.route_helpers import row_response
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+
+def encode_cursor(name, cafe_id):
+    """
+    Encode the (name, id) keyset position of a cafe into an opaque cursor string.
+
+    Args:
+        name: The name of the last cafe on the page.
+        cafe_id: The id of the last cafe on the page.
+
+    Returns:
+        A URL-safe cursor string.
+    """
+    raw = json.dumps([name, cafe_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        name, cafe_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if not isinstance(name, str) or not isinstance(cafe_id, int) or abs(cafe_id) > SQLITE_MAX_INTEGER:
+        raise ValueError("Invalid cursor.")
+    return name, cafe_id
+
+
+def parse_page_args(args):
+    """
+    Read the `limit` and `cursor` query parameters.
+
+    Args:
+        args: The request query arguments.
+
+    Returns:
+        A (limit, after) tuple where `after` is the decoded (name, id) keyset
+        position or None for the first page.
+
+    Raises:
+        ValueError: If either parameter is invalid.
+    """
+    limit = args.get("limit", DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+
+    cursor = args.get("cursor")
+    after = decode_cursor(cursor) if cursor else None
+    return limit, after
+
+
+def page_response(cafes, limit, fragments=None, fields=None):
+    """
+    Build a JSON response for one page of cafes.
+
+    Args:
+        cafes: Up to `limit + 1` rows selected with `cafe_response_columns` plus
+            the cafe id, ordered by (name, id). The extra row only signals that
+            another page exists and is not returned.
+        limit: The page size.
+        fragments: An optional `CafeFragmentCache` to assemble the body from
+            cached per-cafe JSON. Only used for full responses.
+        fields: The fields returned by `parse_fields`, or None for every field.
+            The rows must carry the name and id even when they are not requested.
+
+    Returns:
+        A JSON response with the cafes and the cursor of the next page, if any.
+    """
+    page = cafes[:limit]
+    next_cursor = None
+    if len(cafes) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(last.name, last.id)
+    if fragments is not None and fields is None:
+        encode = current_app.json.dumps_bytes
+        body = b'{"cafes":[' + fragments.join(page, encode) + b'],"next_cursor":' + encode(next_cursor) + b"}"
+        return current_app.response_class(body, mimetype="application/json"), 200
+    return jsonify(cafes=[row_response(cafe, fields) for cafe in page], next_cursor=next_cursor), 200
+
+
+def stream_response(cafes, fields=None):
+    """
+    Stream cafes as a JSON document, encoding one row at a time.
+
+    Args:
+        cafes: An iterable of rows selected with `cafe_response_columns`,
+            typically fetched with `yield_per` so rows are loaded from the
+            database in batches.
+        fields: The fields returned by `parse_fields`, or None for every field.
+
+    Returns:
+        A streamed response with the same shape as the `/api/all` payload.
+    """
+    def generate():
+        dumps = current_app.json.dumps
+        yield '{"cafes":['
+        for index, cafe in enumerate(cafes):
+            if index:
+                yield ","
+            yield dumps(row_response(cafe, fields))
+        yield "]}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+def parse_offset(args):
+    """
+    Read the `offset` query parameter used by ranked, non-keyset listings.
+
+    Raises:
+        ValueError: If the offset is not a non-negative integer, or is larger
+            than SQLite can bind.
+    """
+    try:
+        offset = int(args.get("offset", 0))
+    except (TypeError, ValueError):
+        offset = -1
+    if not 0 <= offset <= SQLITE_MAX_INTEGER:
+        raise ValueError("offset must be a non-negative integer.")
+    return offset
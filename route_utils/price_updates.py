@@ -0,0 +1,84 @@
+from sqlalchemy import case, select
+
+from route_utils.numeric_fields import parse_price
+
+# Ids per UPDATE statement; each id is bound several times, so keep well
+# below SQLite's host parameter limit
+DEFAULT_BATCH_SIZE = 500
+
+
+def parse_price_updates(payload):
+    """
+    Validate a batch price update payload.
+
+    Args:
+        payload: The decoded JSON body, expected to be a list of
+            {"id": int, "coffee_price": str} objects.
+
+    Returns:
+        A dict mapping cafe ids to their new coffee_price.
+
+    Raises:
+        ValueError: If the payload or one of its items is invalid.
+    """
+    if not isinstance(payload, list) or not payload:
+        raise ValueError("Body must be a non-empty JSON array of {id, coffee_price} objects.")
+
+    prices = {}
+    for position, item in enumerate(payload):
+        if not isinstance(item, dict):
+            raise ValueError(f"Item {position} must be an object.")
+        cafe_id = item.get("id")
+        coffee_price = item.get("coffee_price")
+        # bool is an int subclass, so rule it out explicitly
+        if not isinstance(cafe_id, int) or isinstance(cafe_id, bool):
+            raise ValueError(f"Item {position}: id must be an integer.")
+        if not isinstance(coffee_price, str) or not coffee_price.strip():
+            raise ValueError(f"Item {position}: coffee_price cannot be null.")
+        if cafe_id in prices:
+            raise ValueError(f"Item {position}: duplicate id {cafe_id}.")
+        prices[cafe_id] = coffee_price
+    return prices
+
+
+def update_prices(session, Cafe_Model, prices, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Apply new coffee prices with one set-based UPDATE per batch of ids.
+
+    The caller commits, so every batch lands in the same transaction. The
+    derived price columns are set here too, as bulk UPDATEs bypass the model's
+    validators.
+
+    Args:
+        session: The SQLAlchemy session.
+        Cafe_Model: The Cafe model.
+        prices: A dict mapping cafe ids to their new coffee_price.
+        batch_size: Ids per UPDATE statement.
+
+    Returns:
+        An (updated, missing) tuple: a dict mapping each updated cafe id to its
+        location_key, and the sorted list of ids that do not exist.
+    """
+    table = Cafe_Model.__table__
+    ids = list(prices)
+    updated = {}
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        found = session.execute(select(table.c.id, table.c.location_key).where(table.c.id.in_(batch))).all()
+        if not found:
+            continue
+        found_ids = [row.id for row in found]
+        parsed = {cafe_id: parse_price(prices[cafe_id]) for cafe_id in found_ids}
+        session.execute(
+            table.update()
+            .where(table.c.id.in_(found_ids))
+            .values(
+                coffee_price=case({cafe_id: prices[cafe_id] for cafe_id in found_ids}, value=table.c.id),
+                price_minor=case({cafe_id: minor for cafe_id, (minor, _) in parsed.items()}, value=table.c.id),
+                price_currency=case({cafe_id: code for cafe_id, (_, code) in parsed.items()}, value=table.c.id),
+            )
+        )
+        updated.update((row.id, row.location_key) for row in found)
+
+    missing = sorted(cafe_id for cafe_id in ids if cafe_id not in updated)
+    return updated, missing
@@ -0,0 +1,85 @@
+import threading
+
+from sqlalchemy import text
+
+VERSION_TABLE = "cafe_version"
+# Changes from other processes replayed one by one; beyond this, such as after
+# a bulk import, the in-memory state is dropped and reloaded instead
+SYNC_MAX_CHANGES = 1000
+
+_CREATE_VERSION_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+)
+"""
+
+# Every write to `cafe`, from any process, bumps the version
+_CREATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cafe_version_{event.lower()} AFTER {event} ON cafe BEGIN
+        UPDATE {VERSION_TABLE} SET version = version + 1 WHERE id = 1;
+    END
+    """
+    for event in ("INSERT", "UPDATE", "DELETE")
+]
+
+
+def create_version_table(connection):
+    """
+    Create the single-row table counting writes to `cafe`, with its triggers.
+
+    Args:
+        connection: An open SQLAlchemy connection.
+    """
+    connection.exec_driver_sql(_CREATE_VERSION_TABLE)
+    connection.exec_driver_sql(f"INSERT OR IGNORE INTO {VERSION_TABLE} (id, version) VALUES (1, 0)")
+    for trigger in _CREATE_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+
+
+VERSION_QUERY = text(f"SELECT version FROM {VERSION_TABLE} WHERE id = 1")
+
+
+def read_version(session):
+    """Return the current write version of the `cafe` table."""
+    return session.execute(VERSION_QUERY).scalar()
+
+
+class VersionWatcher:
+    """
+    Detects writes made by other processes sharing the same database file.
+
+    The in-memory indexes and response cache of a worker only see the writes
+    that worker handles. When several workers serve the same SQLite file, each
+    one compares the shared write version before serving a read. If the version
+    moved, the changes logged since `applied_seq` are replayed into its
+    in-memory state.
+    """
+
+    def __init__(self):
+        self._seen = None
+        # Last change log sequence number replayed by this process
+        self._applied_seq = None
+        self._lock = threading.Lock()
+
+    @property
+    def applied_seq(self):
+        """The change log position replayed so far, or None before the first check."""
+        return self._applied_seq
+
+    def applied(self, seq):
+        """Record that the changes up to `seq` are reflected in memory."""
+        with self._lock:
+            if self._applied_seq is None or seq > self._applied_seq:
+                self._applied_seq = seq
+
+    def changed(self, version):
+        """
+        Record `version` and report whether it differs from the last one seen.
+
+        The first call only records the version, since nothing has been cached yet.
+        """
+        with self._lock:
+            previous, self._seen = self._seen, version
+        return previous is not None and previous != version
@@ -0,0 +1,90 @@
+import random
+
+from route_utils.generation import GenerationGuard
+
+
+class RandomCafeIndex(GenerationGuard):
+    """
+    A dense in-memory array of live cafe ids used to pick a random cafe in O(1).
+
+    The ids are kept in a plain list so a random position can be chosen directly,
+    and a dictionary maps each id back to its position so removals can swap the
+    last element into the freed slot instead of shifting the whole list.
+
+    The index is loaded lazily from the database on first use and is then kept
+    up to date by the write routes through `add` and `discard`. A load that
+    raced with one of those writes is refused, see `GenerationGuard`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._ids = []
+        self._positions = {}
+        self._loaded = False
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def reset(self):
+        """Forget the contents of the index so it is reloaded on next use."""
+        with self._writing():
+            self._ids = []
+            self._positions = {}
+            self._loaded = False
+
+    def load(self, cafe_ids, generation):
+        """
+        Replace the contents of the index with the given cafe ids, unless a
+        write happened since `generation` was read.
+
+        Args:
+            cafe_ids: An iterable of cafe primary keys.
+            generation: The `generation` read before querying `cafe_ids`.
+
+        Returns:
+            True if the ids were installed, False if they may be stale and
+            should be read again.
+        """
+        ids = list(cafe_ids)
+        with self._installing(generation) as current:
+            if not current:
+                return False
+            self._ids = ids
+            self._positions = {cafe_id: position for position, cafe_id in enumerate(ids)}
+            self._loaded = True
+            return True
+
+    def add(self, cafe_id):
+        """Register a newly created cafe id."""
+        with self._writing():
+            if not self._loaded or cafe_id in self._positions:
+                return
+            self._positions[cafe_id] = len(self._ids)
+            self._ids.append(cafe_id)
+
+    def discard(self, cafe_id):
+        """Remove a cafe id, swapping the last id into its slot."""
+        with self._writing():
+            position = self._positions.pop(cafe_id, None)
+            if position is None:
+                return
+            last_id = self._ids.pop()
+            if last_id != cafe_id:
+                self._ids[position] = last_id
+                self._positions[last_id] = position
+
+    def choice(self):
+        """
+        Pick a random cafe id.
+
+        Returns:
+            A cafe id, or None if the index is empty.
+        """
+        with self._lock:
+            if not self._ids:
+                return None
+            return self._ids[random.randrange(len(self._ids))]
+
+    def __len__(self):
+        return len(self._ids)
@@ -0,0 +1,252 @@
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response, request
+
+from route_utils.compression import compress, is_compressible, negotiate
+from route_utils.generation import GenerationGuard
+
+# Only successful lookups and "nothing found" answers are worth caching
+CACHEABLE_STATUS = (200, 404)
+# Bytes held by all entries, counting their compressed copies
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class CachedResponse:
+    """
+    A serialized response kept in the cache together with its validators.
+
+    Compressed copies of the body are added to `encoded` the first time a
+    client accepts each content coding, so later hits reuse them. `size`
+    counts the body and those copies.
+    """
+    __slots__ = ("body", "status", "mimetype", "etag", "last_modified", "tags", "encoded", "size", "key", "cache")
+
+    def __init__(self, body, status, mimetype, last_modified, tags):
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.last_modified = last_modified
+        self.tags = frozenset(tags)
+        # content coding -> compressed body
+        self.encoded = {}
+        self.size = len(body)
+        # Set by the cache holding the entry, so compressed copies are counted
+        self.key = None
+        self.cache = None
+
+    def negotiate(self, accept_encoding, min_size):
+        """
+        Pick the content coding to send this entry with.
+
+        Returns:
+            A (encoding, varies) tuple. `encoding` is None for the plain body,
+            and `varies` tells whether a Vary: Accept-Encoding header is needed.
+        """
+        if not is_compressible(self.mimetype, len(self.body), min_size):
+            return None, False
+        return negotiate(accept_encoding), True
+
+    def encoded_body(self, encoding):
+        """Return the body compressed with `encoding`, compressing it on first use."""
+        body = self.encoded.get(encoding)
+        if body is None:
+            # Two requests may compress at once, only the copy kept is counted
+            body = self.encoded.setdefault(encoding, compress(self.body, encoding))
+            cache = self.cache
+            if cache is not None and body is self.encoded[encoding]:
+                cache._grow(self, len(body))
+        return body
+
+    def to_response(self, compress_min_size=None):
+        """
+        Build a response for the current request, compressed when the client
+        accepts it. A 200 response becomes 304 when the client's If-None-Match
+        or If-Modified-Since validators still match.
+        """
+        encoding, varies = self.negotiate(request.headers.get("Accept-Encoding"), compress_min_size)
+        if encoding is None:
+            response = Response(self.body, status=self.status, mimetype=self.mimetype)
+            response.set_etag(self.etag)
+        else:
+            response = Response(self.encoded_body(encoding), status=self.status, mimetype=self.mimetype)
+            response.content_encoding = encoding
+            response.set_etag(f"{self.etag}-{encoding}")
+        if varies:
+            response.vary.add("Accept-Encoding")
+        response.last_modified = self.last_modified
+        if self.status != 200:
+            # A cached "nothing found" answer is never turned into 304 Not Modified
+            return response
+        return response.make_conditional(request)
+
+
+class ResponseCache(GenerationGuard):
+    """
+    An LRU cache of serialized read responses, bounded both by a number of
+    entries and by the bytes they hold.
+
+    Entries are stored under a key chosen by the route (endpoint plus its
+    normalized arguments) and labelled with tags describing the data they were
+    built from. Write routes call `invalidate` with the tags of the cafe they
+    changed, so only the affected entries are dropped. A response built from
+    rows that raced with such a write is sent but not kept, see
+    `GenerationGuard`.
+    """
+
+    def __init__(self, max_entries=1024, compress_min_size=None, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Smallest body sent compressed, None to never compress
+        self.compress_min_size = compress_min_size
+        self.last_modified = _now()
+        self._entries = OrderedDict()
+        self._keys_by_tag = {}
+        self._bytes = 0
+        # Hit and miss counts per endpoint, the first element of the key
+        self._stats = {}
+
+    def get_or_build(self, key, tags, build):
+        """
+        Serve `key` from the cache, building and storing the response on a miss.
+
+        Args:
+            key: The cache key, normally the endpoint and its normalized arguments.
+            tags: The tags the entry should be invalidated by.
+            build: A function returning the view's response, or None if there is
+                nothing to return.
+
+        Returns:
+            The response to send to the client, or None if `build` returned None.
+        """
+        entry, generation = self.lookup(key)
+        if entry is not None:
+            return entry.to_response(self.compress_min_size)
+
+        response = build()
+        if response is None:
+            return None
+        if isinstance(response, tuple):
+            response, status = response
+            response.status_code = status
+        if response.status_code not in CACHEABLE_STATUS:
+            return response
+
+        entry = self.store(key, response.get_data(), response.status_code, response.mimetype, tags, generation)
+        return entry.to_response(self.compress_min_size)
+
+    def lookup(self, key):
+        """
+        Look up `key`.
+
+        Returns:
+            A (entry, generation) tuple. `entry` is None on a miss, and
+            `generation` must be passed to `store` when caching the rebuilt
+            response.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            counts = self._stats.setdefault(key[0], [0, 0])
+            counts[entry is None] += 1
+            return entry, self.generation
+
+    def store(self, key, body, status, mimetype, tags, generation):
+        """
+        Cache a serialized response built after `lookup` returned `generation`.
+
+        If a write was committed while the response was being built, or the
+        body alone exceeds `max_bytes`, the entry is returned for this request
+        but not kept.
+
+        Returns:
+            The new cache entry.
+        """
+        with self._installing(generation) as current:
+            entry = CachedResponse(body, status, mimetype, self.last_modified, tags)
+            if not current or self.max_entries <= 0 or entry.size > self.max_bytes:
+                return entry
+            self._remove(key)
+            entry.key, entry.cache = key, self
+            self._entries[key] = entry
+            self._bytes += entry.size
+            for tag in entry.tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            self._evict()
+        return entry
+
+    def invalidate(self, tags):
+        """
+        Drop every entry labelled with any of `tags`.
+        """
+        with self._writing():
+            self.last_modified = _now()
+            for tag in tags:
+                for key in self._keys_by_tag.pop(tag, ()):
+                    self._remove(key)
+
+    def clear(self):
+        with self._writing():
+            self.last_modified = _now()
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return a {endpoint: (hits, misses)} snapshot of the lookups so far."""
+        with self._lock:
+            return {endpoint: tuple(counts) for endpoint, counts in self._stats.items()}
+
+    @property
+    def size_bytes(self):
+        """The bytes held by the cached bodies and their compressed copies."""
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _grow(self, entry, size):
+        # Called by an entry that added a compressed copy of its body
+        with self._lock:
+            if self._entries.get(entry.key) is not entry:
+                return
+            entry.size += size
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+def cafe_tags(cafe_id, location_key):
+    """
+    Return the tags of every cached response a change to one cafe can affect:
+    the full listing, the cafe itself, its exact location and every prefix
+    search that matches its location.
+    """
+    tags = {"all", f"cafe:{cafe_id}", f"location:{location_key}"}
+    if location_key:
+        tags.update(f"prefix:{location_key[:end]}" for end in range(1, len(location_key) + 1))
+    return tags
+
+
+def _now():
+    # HTTP dates have a resolution of one second
+    return datetime.now(timezone.utc).replace(microsecond=0)
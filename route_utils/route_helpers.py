@@ -1,4 +1,21 @@
-from flask import jsonify, request
+import sys
+
+from flask import current_app, jsonify, request
+from sqlalchemy import func
+
+# Keys of a cafe response, in the order produced by `cafe_response_columns`
+CAFE_RESPONSE_FIELDS = (
+    "name",
+    "map_url",
+    "img_url",
+    "location",
+    "seats",
+    "has_toilet",
+    "has_wifi",
+    "has_sockets",
+    "can_take_calls",
+    "coffee_price",
+)
 
 
 def get_cafe_response(cafe):
@@ -26,14 +43,103 @@ def get_cafe_response(cafe):
   }
   return response_dict
 
-def many_responses(all_cafes):
+def cafe_response_columns(Cafe_Model, fields=None):
+    """
+    Build the columns selecting a cafe response directly from SQL.
+
+    Selecting these plain columns instead of the model skips ORM object
+    hydration, and the resulting rows can be turned into response dicts with
+    `row_response`. Missing URLs are replaced with "N/A" in SQL, like
+    `get_cafe_response` does in Python.
+
+    Args:
+        Cafe_Model: The Cafe model class.
+        fields: The fields returned by `parse_fields`, or None for every field.
+
+    Returns:
+        A list of columns in the order of `CAFE_RESPONSE_FIELDS`.
+    """
+    columns = []
+    for field in fields or CAFE_RESPONSE_FIELDS:
+        column = getattr(Cafe_Model, field)
+        if field in ("map_url", "img_url"):
+            column = func.coalesce(func.nullif(column, ""), "N/A").label(field)
+        columns.append(column)
+    return columns
+
+def parse_fields(args):
+    """
+    Read the `fields` query parameter, a comma-separated list of response keys.
+
+    Args:
+        args: The request query arguments.
+
+    Returns:
+        The requested fields in the order of `CAFE_RESPONSE_FIELDS`, or None
+        when the parameter is missing or names every field.
+
+    Raises:
+        ValueError: If the list is empty or names an unknown field.
+    """
+    value = args.get("fields")
+    if value is None:
+        return None
+    requested = {field.strip() for field in value.split(",") if field.strip()}
+    if not requested:
+        raise ValueError("fields cannot be empty.")
+    unknown = requested.difference(CAFE_RESPONSE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Choose from {', '.join(CAFE_RESPONSE_FIELDS)}.")
+    fields = tuple(field for field in CAFE_RESPONSE_FIELDS if field in requested)
+    return None if fields == CAFE_RESPONSE_FIELDS else fields
+
+def row_response(row, fields=None):
+    """
+    Turn a row selected with `cafe_response_columns` into a response dict.
+
+    Extra columns selected after the response columns (such as the id needed
+    for pagination cursors) are ignored. With `fields`, only those keys are
+    returned, read by name from the row or catalog record.
+    """
+    if fields is None:
+        return dict(zip(CAFE_RESPONSE_FIELDS, row))
+    return {field: getattr(row, field) for field in fields}
+
+def many_responses(all_cafes, fragments=None, fields=None):
+    """
+    Build the JSON response for a list of cafes.
+
+    Args:
+        all_cafes: Rows selected with `cafe_response_columns`.
+        fragments: An optional `CafeFragmentCache` to assemble the body from
+            cached per-cafe JSON. The rows must then also carry the cafe id.
+            Only used for full responses.
+        fields: The fields returned by `parse_fields`, or None for every field.
+
+    Returns:
+        A JSON response with the cafes, or a 404 error if there are none.
+    """
     if not all_cafes:  # Check if list is empty
         return jsonify(error={"Not Found": "No cafes found in the database"}), 404
+    elif fragments is not None and fields is None:
+        body = wrap_cafes(fragments.join(all_cafes, current_app.json.dumps_bytes))
+        return current_app.response_class(body, mimetype="application/json"), 200
     else:
-        response = [get_cafe_response(cafe) for cafe in all_cafes]
+        response = [row_response(cafe, fields) for cafe in all_cafes]
         # Use Response Model for GET Request Output
         return jsonify(cafes=response), 200
-    
+
+
+def wrap_cafes(fragment):
+    """Turn comma-joined cafe JSON into the body of a {"cafes": [...]} response."""
+    return b'{"cafes":[' + fragment + b"]}"
+
+
+def wrap_cafe(fragment):
+    """Turn the JSON of one cafe into the body of a {"cafe": {...}} response."""
+    return b'{"cafe":' + fragment + b"}"
+
+
 def new_cafe_check(Cafe_Model):
     new_cafe = Cafe_Model(
         name=request.form.get("name"),
@@ -47,4 +153,44 @@ def new_cafe_check(Cafe_Model):
         seats=request.form.get("seats"),
         coffee_price=request.form.get("coffee_price"),
     )
-    return new_cafe
\ No newline at end of file
+    return new_cafe
+
+
+def normalize_location(location):
+    """
+    Normalize a location for indexed, case-insensitive lookups.
+
+    Surrounding and repeated whitespace is collapsed and the text is casefolded,
+    so "  new  York" and "New York" share the same key.
+
+    Args:
+        location: The location string, or None.
+
+    Returns:
+        The normalized location, or None if no location was given.
+    """
+    if location is None:
+        return None
+    return " ".join(location.split()).casefold()
+
+
+def prefix_upper_bound(prefix):
+    """
+    Return the smallest string greater than every string starting with `prefix`.
+
+    Used to turn a prefix match into a `>= prefix AND < upper` range so the
+    query can be answered with an index range scan. Trailing U+10FFFF
+    characters cannot be incremented and are dropped first, and surrogates,
+    which cannot be encoded, are skipped.
+
+    Returns:
+        The upper bound, or None when `prefix` is only U+10FFFF characters
+        and the range has no upper end.
+    """
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return None
+    next_char = ord(stem[-1]) + 1
+    if 0xD800 <= next_char <= 0xDFFF:
+        next_char = 0xE000
+    return stem[:-1] + chr(next_char)
@@ -0,0 +1,57 @@
+from sqlalchemy import bindparam, inspect, select
+
+
+def add_missing_columns(connection, table):
+    """
+    Add model columns that are missing from an existing database table.
+
+    `db.create_all()` only creates missing tables, so columns added to a model
+    after the database was first created have to be added with ALTER TABLE.
+
+    Args:
+        connection: An open SQLAlchemy connection.
+        table: The SQLAlchemy Table of the model.
+
+    Returns:
+        The names of the columns that were added.
+    """
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(connection.dialect)
+        connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+        added.append(column.name)
+
+    # Indexes declared on the model are only created together with the table
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+    return added
+
+
+def backfill_columns(connection, table, sources, compute, where, batch_size=1000):
+    """
+    Fill derived columns for existing rows in batches.
+
+    Args:
+        connection: An open SQLAlchemy connection.
+        table: The SQLAlchemy Table of the model.
+        sources: The columns read to compute the new values.
+        compute: A function taking a result row and returning a dict of
+            column name to value for that row.
+        where: A clause selecting the rows that still need a value.
+        batch_size: The number of rows updated per executemany call.
+
+    Returns:
+        The number of rows updated.
+    """
+    rows = connection.execute(select(table.c.id, *sources).where(where)).all()
+    if not rows:
+        return 0
+
+    values = [dict(compute(row), _id=row.id) for row in rows]
+    stmt = table.update().where(table.c.id == bindparam("_id"))
+    for start in range(0, len(values), batch_size):
+        connection.execute(stmt, values[start:start + batch_size])
+    return len(values)
@@ -0,0 +1,90 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+logger = logging.getLogger("cafe_api.slow_queries")
+
+# Route of the request being served outside Flask's request context (the ASGI handlers)
+current_route = ContextVar("cafe_current_route", default=None)
+
+
+def originating_route():
+    """Return the route pattern of the request being handled, if any."""
+    from flask import has_request_context, request
+
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule else request.path
+    return current_route.get() or "-"
+
+
+def format_plan(rows):
+    """
+    Indent EXPLAIN QUERY PLAN output as a tree, like the sqlite3 shell does.
+
+    Args:
+        rows: (id, parent, notused, detail) rows.
+    """
+    depth = {0: 0}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return "\n".join(lines)
+
+
+def install_slow_query_log(engine, threshold_ms):
+    """
+    Log every statement on `engine` slower than `threshold_ms`, with its
+    query plan and the route that ran it.
+
+    Plans whose steps include a SCAN of a table (rather than a SEARCH using an
+    index) are marked, since those are what a missing index looks like. The
+    time measured is that of cursor.execute(), which for SQLite covers the
+    query up to its first row; fetching the remaining rows is not included.
+
+    Args:
+        engine: A synchronous SQLAlchemy engine (use `.sync_engine` for async ones).
+        threshold_ms: The duration above which a statement is logged.
+    """
+    threshold = threshold_ms / 1000
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _check_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["slow_query_started"].pop()
+        if elapsed < threshold or conn.info.get("explaining"):
+            return
+
+        # Explain with the first parameter set of an executemany() batch
+        explain_parameters = parameters[0] if executemany and parameters else parameters
+        conn.info["explaining"] = True
+        try:
+            plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", explain_parameters).all()
+        except Exception as error:  # never fail the request over a diagnostic
+            plan_text, full_scan = f"  (no plan: {error})", False
+        else:
+            plan_text = format_plan(plan)
+            full_scan = any(row[3].startswith("SCAN") for row in plan)
+        finally:
+            conn.info["explaining"] = False
+
+        logger.warning(
+            "Slow query (%.1f ms%s) on %s:\n%s\nQuery plan:\n%s",
+            elapsed * 1000,
+            ", full table scan" if full_scan else "",
+            originating_route(),
+            statement,
+            plan_text,
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def _failed_query(exception_context):
+        # after_cursor_execute is skipped when a query fails
+        started = exception_context.connection.info.get("slow_query_started") if exception_context.connection else None
+        if started:
+            started.pop()
@@ -0,0 +1,76 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# PRAGMA settings applied to every new SQLite connection, by profile name
+SQLITE_PROFILES = {
+    # SQLite's own defaults: rollback journal, writers block readers
+    "default": {},
+    # Write-ahead logging lets readers run concurrently with a writer.
+    # synchronous=NORMAL is safe with WAL and skips an fsync per commit.
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,  # ms to wait for a lock before raising "database is locked"
+        "cache_size": -64000,  # negative values are KiB, so about 64 MB of page cache
+        "mmap_size": 268435456,  # read pages through a 256 MB memory map
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def engine_options(database_uri, profile="wal", pool_size=5, max_overflow=10):
+    """
+    Build `SQLALCHEMY_ENGINE_OPTIONS` for an SQLite database.
+
+    File databases get a QueuePool so connections and their PRAGMA setup are
+    reused across requests. In-memory databases keep SQLAlchemy's default pool,
+    since each new connection there would be a separate, empty database.
+
+    Args:
+        database_uri: The SQLAlchemy database URI.
+        profile: A key of `SQLITE_PROFILES`.
+        pool_size: The number of connections kept open.
+        max_overflow: The number of extra connections allowed under load.
+
+    Returns:
+        A dict of `create_engine` keyword arguments.
+    """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile {profile!r}, expected one of: {', '.join(SQLITE_PROFILES)}.")
+
+    url = make_url(database_uri)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return {}
+
+    options = {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        # Pooled connections are shared between request threads
+        "connect_args": {"check_same_thread": False},
+    }
+    busy_timeout = SQLITE_PROFILES[profile].get("busy_timeout")
+    if busy_timeout is not None:
+        options["connect_args"]["timeout"] = busy_timeout / 1000
+    return options
+
+
+def install_pragmas(engine, profile="wal"):
+    """
+    Apply the PRAGMAs of `profile` to every connection `engine` opens.
+
+    Args:
+        engine: A SQLAlchemy engine.
+        profile: A key of `SQLITE_PROFILES`.
+    """
+    pragmas = SQLITE_PROFILES[profile]
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
@@ -0,0 +1,122 @@
+"""
+Production launcher for the Cafe API.
+
+Runs the app built by `main.create_app()` under gunicorn with several worker
+processes, each serving requests on a pool of threads:
+
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:8000
+
+Worker and thread counts default to the WEB_CONCURRENCY and THREADS environment
+variables, or one worker per CPU core and 4 threads.
+
+Running several processes against one SQLite file is safe because:
+- the schema is created and migrated once in the launcher before any worker
+  starts, and SCHEMA_PREPARED tells the workers to skip that setup, so they
+  never race on ALTER TABLE or trigger DDL;
+- the database runs in WAL mode (SQLITE_PROFILE=wal) so readers in every
+  worker proceed while one worker writes, and busy_timeout queues writers;
+- each worker opens its own connections after the fork;
+- SYNC_ACROSS_PROCESSES is turned on so every worker notices when another
+  worker changed the data. Each GET then reads the one-row write version
+  first; when it moved, the changes are replayed from the change log into
+  the worker's in-memory indexes and caches, cafe by cafe. More than
+  SYNC_MAX_CHANGES changes at once (a bulk import) instead make every
+  worker drop that state and reload whole tables on the next reads.
+
+Each open /api/stream connection holds one worker thread for as long as the
+client listens, so unless SSE_MAX_SUBSCRIBERS is set, a worker accepts at most
+half its threads in streams and keeps the rest for other routes. Sync workers
+(--threads 1) refuse streams. Stream events come from the shared change log, so
+a subscriber sees the writes of every worker whichever one it is connected to.
+
+gunicorn is not available on Windows. There, and whenever gunicorn is not
+installed, the app is served by a single-process threaded server instead.
+"""
+import argparse
+import multiprocessing
+import os
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve the Cafe API in production mode.")
+    parser.add_argument("--bind", default=os.getenv("BIND", "127.0.0.1:5001"), help="host:port to listen on.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count())),
+        help="Number of worker processes.",
+    )
+    parser.add_argument("--threads", type=int, default=int(os.getenv("THREADS", 4)), help="Threads per worker.")
+    parser.add_argument("--timeout", type=int, default=int(os.getenv("TIMEOUT", 30)), help="Worker timeout in seconds.")
+    return parser
+
+
+def prepare_database():
+    """Create and migrate the schema once, before any worker is started."""
+    from main import create_app, db, ensure_database
+
+    app = create_app({"SCHEMA_PREPARED": False})
+    ensure_database(app)
+    with app.app_context():
+        # Don't hand open SQLite connections over to forked workers
+        db.engine.dispose()
+    # Inherited by the workers, which then only look up the optional indexes
+    os.environ["SCHEMA_PREPARED"] = "1"
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class CafeApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", args.bind)
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("worker_class", "gthread" if args.threads > 1 else "sync")
+            self.cfg.set("timeout", args.timeout)
+            # Build the app in each worker so every process gets its own engine
+            self.cfg.set("preload_app", False)
+
+        def load(self):
+            from main import create_app
+
+            return create_app()
+
+    CafeApplication().run()
+
+
+def run_threaded(args):
+    from werkzeug.serving import run_simple
+
+    from main import create_app
+
+    host, _, port = args.bind.rpartition(":")
+    run_simple(host or "127.0.0.1", int(port), create_app(), threaded=True)
+
+
+def main():
+    try:
+        from dotenv import load_dotenv
+    except ImportError:  # .env support is optional
+        pass
+    else:
+        load_dotenv()
+    args = build_parser().parse_args()
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print("gunicorn is not installed, serving with a single threaded process.")
+        run_threaded(args)
+        return
+
+    if args.workers > 1:
+        os.environ["SYNC_ACROSS_PROCESSES"] = "1"
+    # Streams must never take every thread of a worker
+    os.environ.setdefault("SSE_MAX_SUBSCRIBERS", str(args.threads // 2))
+    prepare_database()
+    run_gunicorn(args)
+
+
+if __name__ == "__main__":
+    main()